@@ -1,28 +1,135 @@
 from passlib.context import CryptContext
+from passlib.hash import argon2 as argon2_hash
 from jose import JWTError, jwt
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Callable, List, Optional, Tuple
+import asyncio
 import os
+import time
 from dotenv import load_dotenv
 
 load_dotenv()
 
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Password hashing. New hashes use PASSWORD_SCHEME at the configured cost;
+# hashes in the other scheme or at another cost still verify and are
+# replaced on the user's next successful login (see verify_and_update_password).
+# argon2 needs the optional argon2-cffi package; without it bcrypt is used.
+PASSWORD_SCHEME = os.getenv("PASSWORD_SCHEME", "bcrypt")
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+ARGON2_TIME_COST = int(os.getenv("ARGON2_TIME_COST", "2"))
+ARGON2_MEMORY_COST = int(os.getenv("ARGON2_MEMORY_COST", "19456"))  # KiB
+
+def argon2_available() -> bool:
+    return argon2_hash.has_backend()
+
+def build_password_context(scheme: str = "bcrypt", bcrypt_rounds: int = 12,
+                           argon2_time_cost: int = 2, argon2_memory_cost: int = 19456) -> CryptContext:
+    """CryptContext hashing with scheme at the given cost; other known schemes verify but are deprecated"""
+    schemes = ["argon2", "bcrypt"] if argon2_available() else ["bcrypt"]
+    if scheme not in schemes:
+        print(f"⚠️ Password scheme {scheme!r} unavailable, using bcrypt")
+        scheme = "bcrypt"
+    schemes.remove(scheme)
+    return CryptContext(
+        schemes=[scheme] + schemes,
+        deprecated="auto",
+        bcrypt__rounds=bcrypt_rounds,
+        argon2__time_cost=argon2_time_cost,
+        argon2__memory_cost=argon2_memory_cost,
+    )
+
+pwd_context = build_password_context(PASSWORD_SCHEME, BCRYPT_ROUNDS, ARGON2_TIME_COST, ARGON2_MEMORY_COST)
+
+# Password hashing runs on a small thread pool (bcrypt and argon2 release the GIL) so it
+# never blocks the event loop; beyond PASSWORD_QUEUE_LIMIT waiting or running
+# jobs new ones are rejected instead of queueing without bound
+PASSWORD_WORKERS = int(os.getenv("PASSWORD_WORKERS", "2"))
+PASSWORD_QUEUE_LIMIT = int(os.getenv("PASSWORD_QUEUE_LIMIT", "16"))
 
 # JWT settings
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-change-this-in-production")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 * 7  # 7 days
+CLAIMS_VERSION = 1  # Bump when the claim set changes; older tokens fall back to a user lookup
+GUEST_CART_TOKEN_EXPIRE_DAYS = int(os.getenv("GUEST_CART_TOKEN_EXPIRE_DAYS", "30"))
+GUEST_CART_TOKEN_TYPE = "guest_cart"
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a password against a hash"""
     return pwd_context.verify(plain_password, hashed_password)
 
+def verify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """Verify a password; also return a new hash if the stored one is outdated"""
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
 def get_password_hash(password: str) -> str:
     """Hash a password"""
     return pwd_context.hash(password)
 
+class PasswordPoolFull(Exception):
+    """Raised when too many password hashes are already queued"""
+
+
+class PasswordPool:
+    """Bounded executor for password hashing with queue and timing metrics"""
+
+    def __init__(self, workers: int, max_pending: int):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.pending = 0
+        self.peak_pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.wait_seconds = 0.0
+        self.run_seconds = 0.0
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password")
+
+    async def run(self, fn: Callable, *args):
+        """Run fn(*args) on the pool; raises PasswordPoolFull when the queue is full"""
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise PasswordPoolFull()
+
+        def timed():
+            started = time.perf_counter()
+            return started, fn(*args), time.perf_counter()
+
+        self.pending += 1
+        self.peak_pending = max(self.peak_pending, self.pending)
+        queued = time.perf_counter()
+        try:
+            started, result, finished = await asyncio.get_running_loop().run_in_executor(self._executor, timed)
+        finally:
+            self.pending -= 1
+        self.completed += 1
+        self.wait_seconds += started - queued
+        self.run_seconds += finished - started
+        return result
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "maxPending": self.max_pending,
+            "pending": self.pending,
+            "peakPending": self.peak_pending,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "avgWaitMs": round(self.wait_seconds / self.completed * 1000, 1) if self.completed else 0.0,
+            "avgRunMs": round(self.run_seconds / self.completed * 1000, 1) if self.completed else 0.0,
+        }
+
+
+password_pool = PasswordPool(PASSWORD_WORKERS, PASSWORD_QUEUE_LIMIT)
+
+async def verify_and_update_password_async(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """verify_and_update_password on the password pool"""
+    return await password_pool.run(verify_and_update_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password: str) -> str:
+    """get_password_hash on the password pool"""
+    return await password_pool.run(get_password_hash, password)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """Create a JWT access token"""
     to_encode = data.copy()
@@ -35,6 +142,17 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+def user_claims(user) -> dict:
+    """Access token claims that let routes authorize without loading the user"""
+    return {
+        "sub": user.id,
+        "cv": CLAIMS_VERSION,
+        "role": "admin" if user.isAdmin else "customer",
+        "name": user.name,
+        "email": user.email,
+        "tv": user.tokenVersion,
+    }
+
 def decode_access_token(token: str) -> Optional[dict]:
     """Decode and validate a JWT token"""
     try:
@@ -42,3 +160,25 @@ def decode_access_token(token: str) -> Optional[dict]:
         return payload
     except JWTError:
         return None
+
+def create_guest_cart_token(items: List[dict]) -> str:
+    """Create a signed token holding a guest cart (no database record)"""
+    # Lines are packed as [productId, quantity(, variant)] to keep the token short
+    lines = [
+        [item["productId"], item["quantity"]] + ([item["variant"]] if item.get("variant") else [])
+        for item in items
+    ]
+    return create_access_token(
+        {"typ": GUEST_CART_TOKEN_TYPE, "items": lines},
+        expires_delta=timedelta(days=GUEST_CART_TOKEN_EXPIRE_DAYS),
+    )
+
+def decode_guest_cart_token(token: str) -> Optional[List[dict]]:
+    """Decode a guest cart token into cart items (None if invalid or expired)"""
+    payload = decode_access_token(token)
+    if not payload or payload.get("typ") != GUEST_CART_TOKEN_TYPE:
+        return None
+    return [
+        {"productId": line[0], "quantity": line[1], "variant": line[2] if len(line) > 2 else None}
+        for line in payload.get("items", [])
+    ]
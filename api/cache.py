@@ -0,0 +1,220 @@
+"""
+In-process caches
+
+TTLCache is a small bounded LRU with per-entry expiry and hit/miss counters.
+CatalogCache builds on it to hold snapshots of catalog data (products,
+categories) that only change when an admin writes them: write routes call
+invalidate(), which bumps the catalog version and drops every cached view.
+The TTL bounds staleness for writes made through other instances.
+DataVersions is a plain set of write counters for other collections
+(blog, orders) that response-level caches key on. auth_tokens and
+auth_users hold decoded access tokens and the User behind them, so
+authenticated requests skip the users lookup; the short TTL bounds how
+long a change made on another instance goes unseen. token_versions keeps
+each user's current token version for claims-based auth; stale entries are
+still served while a background refresh reloads them.
+"""
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable, Optional
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Bounded LRU cache whose entries expire ttl seconds after being set"""
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._data.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._data[key]
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key: Hashable, value: Any) -> None:
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+    def pop(self, key: Hashable) -> None:
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def __contains__(self, key: Hashable) -> bool:
+        """Whether key holds a live entry (not counted as a hit or miss)"""
+        entry = self._data.get(key)
+        return entry is not None and entry[0] >= time.monotonic()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._data),
+            "maxEntries": self.max_entries,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hitRate": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
+
+
+class CatalogCache:
+    """Versioned snapshot cache for catalog reads.
+
+    Per-query results (one entry per filter combination or store) live in
+    their own smaller LRU, so arbitrary query strings can only evict each
+    other, never the snapshots they are derived from.
+    """
+
+    def __init__(self, max_entries: int, ttl: float, max_filtered: int):
+        self.version = 0
+        self._views = TTLCache(max_entries, ttl)
+        self._filtered = TTLCache(max_filtered, ttl)
+        self._pending: dict = {}
+
+    def invalidate(self) -> None:
+        """Drop every cached view (call after any catalog write)"""
+        self.version += 1
+        self._views.clear()
+        self._filtered.clear()
+
+    def cached(self, key: Hashable) -> bool:
+        """Whether the view for key is built (reading it would not hit the database)"""
+        return key in self._views
+
+    async def view(self, key: Hashable, build: Callable[[], Awaitable[Any]]) -> Any:
+        """Return the cached view for key, building it once on a miss.
+
+        Concurrent misses for the same key share a single build, and a
+        build that straddles an invalidate() is returned but not stored.
+        """
+        return await self._view(self._views, key, build)
+
+    async def filtered_view(self, key: Hashable, build: Callable[[], Awaitable[Any]]) -> Any:
+        """Like view(), for per-query results (kept in the filtered LRU)"""
+        return await self._view(self._filtered, ("filtered", key), build)
+
+    async def _view(self, views: TTLCache, key: Hashable, build: Callable[[], Awaitable[Any]]) -> Any:
+        cached = views.get(key, _MISSING)
+        if cached is not _MISSING:
+            return cached
+
+        pending_key = (self.version, key)
+        pending: Optional[asyncio.Future] = self._pending.get(pending_key)
+        if pending is not None:
+            return await asyncio.shield(pending)
+
+        version = self.version
+        future = asyncio.get_running_loop().create_future()
+        self._pending[pending_key] = future
+        try:
+            value = await build()
+        except Exception as e:
+            future.set_exception(e)
+            # Mark retrieved so an unawaited failure is not logged twice
+            future.exception()
+            raise
+        else:
+            future.set_result(value)
+            if version == self.version:
+                views.set(key, value)
+            return value
+        finally:
+            self._pending.pop(pending_key, None)
+
+    def stats(self) -> dict:
+        return {"version": self.version, **self._views.stats(), "filtered": self._filtered.stats()}
+
+
+class VersionCache:
+    """Per-key version numbers, refreshed in the background once stale.
+
+    A value older than refresh_after is returned as-is while a reload runs
+    in a task; values older than max_age are dropped and reloaded inline.
+    """
+
+    def __init__(self, max_entries: int, refresh_after: float, max_age: float):
+        self.refresh_after = refresh_after
+        self._entries = TTLCache(max_entries, max_age)
+        self._refreshing: dict = {}
+
+    async def get(self, key: Hashable, load: Callable[[Hashable], Awaitable[Any]]) -> Any:
+        entry = self._entries.get(key)
+        if entry is None:
+            value = await load(key)
+            self.set(key, value)
+            return value
+        value, loaded_at = entry
+        if time.monotonic() - loaded_at > self.refresh_after and key not in self._refreshing:
+            self._refreshing[key] = asyncio.get_running_loop().create_task(self._refresh(key, load))
+        return value
+
+    async def _refresh(self, key: Hashable, load: Callable[[Hashable], Awaitable[Any]]) -> None:
+        try:
+            self.set(key, await load(key))
+        except Exception:
+            pass  # keep serving the cached value; the next stale read retries
+        finally:
+            self._refreshing.pop(key, None)
+
+    def set(self, key: Hashable, value: Any) -> None:
+        self._entries.set(key, (value, time.monotonic()))
+
+    def stats(self) -> dict:
+        return {"refreshAfter": self.refresh_after, "refreshing": len(self._refreshing), **self._entries.stats()}
+
+
+class DataVersions:
+    """Per-collection write counters for data not covered by CatalogCache"""
+
+    def __init__(self):
+        self._versions: dict = {}
+
+    def bump(self, name: str) -> None:
+        self._versions[name] = self._versions.get(name, 0) + 1
+
+    def get(self, name: str) -> int:
+        return self._versions.get(name, 0)
+
+
+catalog = CatalogCache(
+    max_entries=int(os.getenv("CATALOG_CACHE_MAX_ENTRIES", "256")),
+    ttl=float(os.getenv("CATALOG_CACHE_TTL", "60")),
+    max_filtered=int(os.getenv("CATALOG_FILTERED_MAX_ENTRIES", "128")),
+)
+
+data_versions = DataVersions()
+
+auth_tokens = TTLCache(
+    max_entries=int(os.getenv("AUTH_CACHE_MAX_ENTRIES", "1024")),
+    ttl=float(os.getenv("AUTH_CACHE_TTL", "30")),
+)
+
+auth_users = TTLCache(
+    max_entries=int(os.getenv("AUTH_CACHE_MAX_ENTRIES", "1024")),
+    ttl=float(os.getenv("AUTH_CACHE_TTL", "30")),
+)
+
+token_versions = VersionCache(
+    max_entries=int(os.getenv("AUTH_CACHE_MAX_ENTRIES", "1024")),
+    refresh_after=float(os.getenv("TOKEN_VERSION_REFRESH", "15")),
+    max_age=float(os.getenv("TOKEN_VERSION_MAX_AGE", "300")),
+)
@@ -0,0 +1,210 @@
+"""
+Precompressed response cache
+
+ASGI middleware for a few hot, large GET endpoints. The first request for
+a (path, query, data version) renders the route as usual; the body is
+then kept in a byte-bounded LRU together with its gzip and brotli
+encodings (each produced once, on first demand). Later requests are served
+straight from memory in the encoding the client accepts, so neither the
+route nor the compressor runs again until the data version changes or
+the entry's TTL expires.
+
+Brotli is optional: without the package only gzip (and identity) is served.
+"""
+import gzip
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Dict, Hashable, Optional
+
+from starlette.datastructures import Headers
+
+from etag import etag_matches
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+MIN_COMPRESS_SIZE = 500
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+@dataclass
+class CachedRoute:
+    """Cache settings for one exact path"""
+    version: Callable[[], Hashable]
+    ttl: float = 60
+    vary_auth: bool = False  # per-token entries (for authenticated routes)
+
+
+class _Entry:
+    __slots__ = ("expires", "headers", "bodies", "etag")
+
+    def __init__(self, expires: float, headers: list, body: bytes, etag: Optional[str]):
+        self.expires = expires
+        self.headers = headers
+        self.bodies = {"identity": body}
+        self.etag = etag
+
+    @property
+    def size(self) -> int:
+        return sum(len(body) for body in self.bodies.values())
+
+
+class ResponseCache:
+    """Byte-bounded LRU of rendered responses and their encodings"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Hashable, _Entry]" = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[_Entry]:
+        entry = self._entries.get(key)
+        if entry is None or entry.expires < time.monotonic():
+            if entry is not None:
+                self._discard(key)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def put(self, key: Hashable, entry: _Entry) -> None:
+        self._discard(key)
+        if entry.size > self.max_bytes // 4:
+            return
+        self._entries[key] = entry
+        self.bytes += entry.size
+        self._evict()
+
+    def encoded(self, key: Hashable, entry: _Entry, encoding: str) -> bytes:
+        """Body in encoding, compressing (and accounting for) it on first use"""
+        body = entry.bodies.get(encoding)
+        if body is None:
+            raw = entry.bodies["identity"]
+            if encoding == "br":
+                body = brotli.compress(raw, quality=BROTLI_QUALITY)
+            else:
+                body = gzip.compress(raw, compresslevel=GZIP_LEVEL)
+            entry.bodies[encoding] = body
+            if self._entries.get(key) is entry:
+                self.bytes += len(body)
+                self._evict()
+        return body
+
+    def _discard(self, key: Hashable) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.bytes -= entry.size
+
+    def _evict(self) -> None:
+        while self.bytes > self.max_bytes and self._entries:
+            _, entry = self._entries.popitem(last=False)
+            self.bytes -= entry.size
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "maxBytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "brotli": brotli is not None,
+        }
+
+
+response_cache = ResponseCache(max_bytes=int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(8 * 1024 * 1024))))
+
+
+def choose_encoding(accept_encoding: str) -> str:
+    accepted = {part.split(";")[0].strip().lower() for part in accept_encoding.split(",")}
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return "identity"
+
+
+class CompressedResponseCacheMiddleware:
+    """Serve registered GET routes from ResponseCache, compressed per Accept-Encoding"""
+
+    def __init__(self, app, routes: Dict[str, CachedRoute], cache: ResponseCache = response_cache):
+        self.app = app
+        self.routes = routes
+        self.cache = cache
+
+    async def __call__(self, scope, receive, send):
+        route = self.routes.get(scope.get("path")) if scope["type"] == "http" else None
+        if route is None or scope["method"] != "GET":
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        encoding = choose_encoding(headers.get("accept-encoding", ""))
+        key = (scope["path"], scope.get("query_string", b""), route.version())
+        if route.vary_auth:
+            authorization = headers.get("authorization", "")
+            key += (hashlib.sha256(authorization.encode()).hexdigest(),)
+
+        entry = self.cache.get(key)
+        if entry is None:
+            entry = await self._render(scope, receive, send, route)
+            if entry is None:
+                return  # not cacheable, already sent as-is
+            self.cache.put(key, entry)
+            cache_status = "MISS"
+        else:
+            cache_status = "HIT"
+
+        if entry.etag and etag_matches(headers.get("if-none-match"), entry.etag):
+            await self._send(send, 304, entry.headers, b"", None, cache_status)
+            return
+        if len(entry.bodies["identity"]) < MIN_COMPRESS_SIZE:
+            encoding = "identity"
+        body = self.cache.encoded(key, entry, encoding) if encoding != "identity" else entry.bodies["identity"]
+        await self._send(send, 200, entry.headers, body, encoding, cache_status)
+
+    async def _render(self, scope, receive, send, route: CachedRoute) -> Optional[_Entry]:
+        """Run the route; return a cache entry for a 200, else pass the response through"""
+        start: dict = {}
+        chunks = []
+
+        async def capture(message):
+            if message["type"] == "http.response.start":
+                start.update(message)
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+
+        await self.app(scope, receive, capture)
+
+        body = b"".join(chunks)
+        response_headers = [
+            (name, value) for name, value in start.get("headers", [])
+            if name.lower() not in (b"content-length", b"content-encoding", b"vary")
+        ]
+        if start.get("status") != 200:
+            await send({**start, "headers": response_headers + [
+                (b"content-length", str(len(body)).encode())]})
+            await send({"type": "http.response.body", "body": body})
+            return None
+
+        etag = Headers(raw=response_headers).get("etag")
+        return _Entry(time.monotonic() + route.ttl, response_headers, body, etag)
+
+    @staticmethod
+    async def _send(send, status: int, headers: list, body: bytes,
+                    encoding: Optional[str], cache_status: str) -> None:
+        out = list(headers) + [(b"vary", b"Accept-Encoding"), (b"x-cache", cache_status.encode())]
+        if encoding and encoding != "identity":
+            out.append((b"content-encoding", encoding.encode()))
+        if status != 304:
+            out.append((b"content-length", str(len(body)).encode()))
+        await send({"type": "http.response.start", "status": status, "headers": out})
+        await send({"type": "http.response.body", "body": body})
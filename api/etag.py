@@ -0,0 +1,62 @@
+"""
+Weak ETag helpers for public read endpoints
+
+An ETag is derived from a cheap fingerprint of the data behind a response
+(document count plus the newest timestamp) and the request parameters,
+never from the serialized body, so a matching If-None-Match can be
+answered with 304 before any documents are loaded or encoded.
+"""
+import hashlib
+from typing import Optional, Tuple
+
+from fastapi import Response
+
+ETAG_HEADERS = {"Cache-Control": "no-cache"}  # always revalidate, reuse on 304
+
+
+def weak_etag(*parts) -> str:
+    digest = hashlib.sha1(repr(parts).encode()).hexdigest()[:20]
+    return f'W/"{digest}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against etag"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    wanted = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == wanted:
+            return True
+    return False
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, **ETAG_HEADERS})
+
+
+def set_etag(response: Response, etag: str) -> None:
+    response.headers["ETag"] = etag
+    response.headers.update(ETAG_HEADERS)
+
+
+def docs_fingerprint(docs: list, field: str = "updatedAt") -> Tuple[int, Optional[str]]:
+    """(count, newest field value) of an in-memory snapshot"""
+    newest = max((doc[field] for doc in docs if doc.get(field)), default=None)
+    return len(docs), newest.isoformat() if newest else None
+
+
+async def collection_fingerprint(collection, query: dict, field: str = "updatedAt") -> Tuple[int, Optional[str]]:
+    """(count, newest field value) of the documents matching query, in one round trip"""
+    result = await collection.aggregate([
+        {"$match": query},
+        {"$group": {"_id": None, "count": {"$sum": 1}, "newest": {"$max": f"${field}"}}},
+    ]).to_list(1)
+    if not result:
+        return 0, None
+    newest = result[0].get("newest")
+    return result[0]["count"], newest.isoformat() if newest else None
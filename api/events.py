@@ -0,0 +1,143 @@
+"""
+Shared event log for live admin feeds
+
+Routes append small JSON events (order created, order status changed) to a
+MongoDB collection. Each event takes the next number from a counter
+document, so ids are global: every instance (each serverless function)
+reads the same log, and a client's Last-Event-ID means the same thing
+wherever it reconnects. Streams poll the log for events past the last id
+they sent. Old events expire through a TTL index; a client whose id is no
+longer covered by the log (expired, or never issued) gets a resync event
+and reloads its list.
+
+A number is taken before its event is written, so for a moment a later
+event can be visible before an earlier one. Readers stop at such a gap and
+wait up to GAP_GRACE seconds for it to fill; a gap left by a publisher that
+failed between the two writes is then skipped.
+"""
+import asyncio
+import os
+from datetime import datetime, timedelta
+from typing import AsyncIterator, List, Optional
+
+import orjson
+from pymongo import ReturnDocument
+
+ORDER_EVENTS_TTL_HOURS = int(os.getenv("ORDER_EVENTS_TTL_HOURS", "24"))
+POLL_INTERVAL = float(os.getenv("ORDER_STREAM_POLL_SECONDS", "1"))
+GAP_GRACE = timedelta(seconds=2)
+READ_BATCH = 100
+
+
+def ready_events(docs: List[dict], after: int, now: datetime) -> List[dict]:
+    """The events in docs (sorted by seq) that can be sent after seq `after`,
+    stopping at a gap that may still be filled"""
+    ready = []
+    expected = after + 1
+    for doc in docs:
+        if doc["seq"] != expected and now - doc["createdAt"] < GAP_GRACE:
+            break
+        ready.append(doc)
+        expected = doc["seq"] + 1
+    return ready
+
+
+class EventLog:
+    """Events in one collection, numbered from a counter document"""
+
+    def __init__(self, collection: str):
+        self.collection = collection
+        self.published = 0
+        self.failed = 0
+        self.resyncs = 0
+        self.streams = 0
+
+    async def publish(self, db, event_type: str, data: dict) -> Optional[int]:
+        """Append an event and return its id; failures are logged, never raised"""
+        try:
+            counter = await db.counters.find_one_and_update(
+                {"_id": self.collection}, {"$inc": {"seq": 1}},
+                upsert=True, return_document=ReturnDocument.AFTER,
+            )
+            await db[self.collection].insert_one({
+                "seq": counter["seq"], "type": event_type, "data": data, "createdAt": datetime.utcnow(),
+            })
+        except Exception as e:
+            self.failed += 1
+            print(f"⚠️ Could not publish {event_type} event: {e}")
+            return None
+        self.published += 1
+        return counter["seq"]
+
+    async def _latest(self, db) -> int:
+        counter = await db.counters.find_one({"_id": self.collection})
+        return counter["seq"] if counter else 0
+
+    async def _resume_point(self, db, last_event_id: Optional[str]) -> tuple:
+        """(seq to read after, whether the client must resync)"""
+        latest = await self._latest(db)
+        if last_event_id is None:
+            return latest, False  # new client: only events from now on
+        try:
+            last = int(last_event_id)
+        except ValueError:
+            return latest, True
+        if last < 0 or last > latest:
+            return latest, True  # never issued by this log
+        if last < latest:
+            oldest = await db[self.collection].find_one({}, {"seq": 1}, sort=[("seq", 1)])
+            if oldest is None or oldest["seq"] > last + 1:
+                return latest, True  # the events after it have expired
+        return last, False
+
+    async def read(self, db, after: int) -> List[dict]:
+        docs = await db[self.collection].find(
+            {"seq": {"$gt": after}}, {"_id": 0}
+        ).sort("seq", 1).limit(READ_BATCH).to_list(READ_BATCH)
+        return ready_events(docs, after, datetime.utcnow())
+
+    async def follow(self, db, last_event_id: Optional[str] = None, poll: float = POLL_INTERVAL,
+                     heartbeat: float = 15, max_seconds: float = 0) -> AsyncIterator[Optional[tuple]]:
+        """Yield (id, type, data) events, None as a heartbeat, until max_seconds pass"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + max_seconds if max_seconds else None
+        self.streams += 1
+        try:
+            after, resync = await self._resume_point(db, last_event_id)
+            if resync:
+                self.resyncs += 1
+                yield after, "resync", {}
+            quiet_since = loop.time()
+            while deadline is None or loop.time() < deadline:
+                for doc in await self.read(db, after):
+                    after = doc["seq"]
+                    quiet_since = loop.time()
+                    yield doc["seq"], doc["type"], doc["data"]
+                if loop.time() - quiet_since >= heartbeat:
+                    quiet_since = loop.time()
+                    yield None
+                wait = poll if deadline is None else min(poll, deadline - loop.time())
+                if wait > 0:
+                    await asyncio.sleep(wait)
+        finally:
+            self.streams -= 1
+
+    def stats(self) -> dict:
+        return {
+            "collection": self.collection,
+            "openStreams": self.streams,
+            "published": self.published,
+            "failedPublishes": self.failed,
+            "resyncs": self.resyncs,
+        }
+
+
+def sse_message(event: Optional[tuple]) -> str:
+    """Format an event (or None, a heartbeat) as a Server-Sent Events message"""
+    if event is None:
+        return ": keep-alive\n\n"
+    event_id, event_type, data = event
+    return f"id: {event_id}\nevent: {event_type}\ndata: {orjson.dumps(data).decode()}\n\n"
+
+
+order_events = EventLog("order_events")
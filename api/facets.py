@@ -0,0 +1,204 @@
+"""
+In-memory bitmap index for faceted product filtering
+
+Every facet value owns a bitmap (a Python int) with one bit per product in
+the catalog snapshot. Filtering is AND across dimensions and OR within a
+dimension; facet counts use the usual "all filters except this dimension"
+rule so a sidebar can show how many results each option would give. A
+full recount is a handful of integer ANDs and popcounts per value, with
+no extra database work.
+
+The index is rebuilt from the catalog snapshot whenever its version
+changes (see catalog_facets in routes.py).
+"""
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+BOOLEAN_DIMENSIONS = ("inStock", "isNew", "featured")
+PRICE_BUCKETS = 4
+
+
+@dataclass(frozen=True)
+class ProductFilters:
+    """Selected filters; tuples keep it hashable for use as a cache key"""
+    category: Tuple[str, ...] = ()
+    store: Optional[str] = None
+    featured: Optional[bool] = None
+    inStock: Optional[bool] = None
+    isNew: Optional[bool] = None
+    minPrice: Optional[float] = None
+    maxPrice: Optional[float] = None
+    details: Tuple[str, ...] = ()  # "Label:Value"
+    variants: Tuple[str, ...] = ()
+
+    def detail_selection(self) -> Dict[str, set]:
+        selected: Dict[str, set] = defaultdict(set)
+        for item in self.details:
+            label, _, value = item.partition(":")
+            selected[label.strip()].add(value.strip())
+        return selected
+
+    def mongo_query(self) -> dict:
+        """The same selection as a MongoDB query (for reads that bypass the snapshot)"""
+        clauses = []
+        if self.store:
+            clauses.append({"store": {"$in": [self.store, None, ""]}})
+        if self.category:
+            clauses.append({"category": {"$in": list(self.category)}})
+        for name, default in _defaults({}).items():
+            value = getattr(self, name)
+            if value is not None:
+                # Missing fields count as their default, as in the bitmaps
+                clauses.append({name: {"$ne": not value} if value == default else value})
+        if self.minPrice is not None or self.maxPrice is not None:
+            price = {}
+            if self.minPrice is not None:
+                price["$gte"] = self.minPrice
+            if self.maxPrice is not None:
+                price["$lte"] = self.maxPrice
+            clauses.append({"price": price})
+        if self.variants:
+            clauses.append({"variants.name": {"$in": list(self.variants)}})
+        for label, values in self.detail_selection().items():
+            clauses.append({"details": {"$elemMatch": {"label": label, "value": {"$in": sorted(values)}}}})
+        if not clauses:
+            return {}
+        return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+def _defaults(doc: dict) -> dict:
+    return {"inStock": doc.get("inStock", True), "isNew": doc.get("isNew", False),
+            "featured": doc.get("featured", False)}
+
+
+class FacetIndex:
+    """Bitmaps over a fixed, ordered list of product docs"""
+
+    def __init__(self, docs: List[dict]):
+        self.docs = docs
+        self.all = (1 << len(docs)) - 1
+        self.bitmaps: Dict[str, Dict] = defaultdict(lambda: defaultdict(int))
+        self.shared_store = 0  # products without a store show in every store
+        self.store: Dict[str, int] = defaultdict(int)
+        prices = []
+
+        for position, doc in enumerate(docs):
+            bit = 1 << position
+            self.bitmaps["category"][doc.get("category")] |= bit
+            for name, value in _defaults(doc).items():
+                self.bitmaps[name][value] |= bit
+            for variant in doc.get("variants") or []:
+                self.bitmaps["variants"][variant.get("name")] |= bit
+            for detail in doc.get("details") or []:
+                self.bitmaps["detail:" + detail.get("label", "")][detail.get("value")] |= bit
+            if doc.get("store"):
+                self.store[doc["store"]] |= bit
+            else:
+                self.shared_store |= bit
+            prices.append((doc.get("price", 0), bit))
+
+        prices.sort(key=lambda item: item[0])
+        self._prices = prices
+        self.price_buckets = [
+            (low, high, self.price_mask(low, high))
+            for low, high in self._bucket_edges([p for p, _ in prices])
+        ]
+
+    @staticmethod
+    def _bucket_edges(sorted_prices: List[float]) -> List[Tuple[float, float]]:
+        """Split the price range into roughly equal-count buckets"""
+        if not sorted_prices:
+            return []
+        edges = sorted({
+            round(sorted_prices[len(sorted_prices) * i // PRICE_BUCKETS])
+            for i in range(1, PRICE_BUCKETS)
+        } | {0})
+        highest = sorted_prices[-1]
+        bounds = edges + [max(highest, edges[-1]) + 1]
+        return [(low, high) for low, high in zip(bounds, bounds[1:]) if low < high]
+
+    def price_mask(self, low: Optional[float], high: Optional[float], inclusive: bool = False) -> int:
+        """Products with low <= price < high (<= high if inclusive; bounds optional)"""
+        mask = 0
+        for price, bit in self._prices:
+            if low is not None and price < low:
+                continue
+            if high is not None and (price > high if inclusive else price >= high):
+                break
+            mask |= bit
+        return mask
+
+    def _any_of(self, dimension: str, values) -> int:
+        bitmaps = self.bitmaps.get(dimension, {})
+        mask = 0
+        for value in values:
+            mask |= bitmaps.get(value, 0)
+        return mask
+
+    def _dimension_masks(self, filters: ProductFilters) -> Dict[str, int]:
+        """One mask per dimension that has a selection"""
+        masks: Dict[str, int] = {}
+        if filters.store:
+            masks["store"] = self.shared_store | self.store.get(filters.store, 0)
+        if filters.category:
+            masks["category"] = self._any_of("category", filters.category)
+        for name in BOOLEAN_DIMENSIONS:
+            value = getattr(filters, name)
+            if value is not None:
+                masks[name] = self._any_of(name, [value])
+        if filters.minPrice is not None or filters.maxPrice is not None:
+            masks["price"] = self.price_mask(filters.minPrice, filters.maxPrice, inclusive=True)
+        if filters.variants:
+            masks["variants"] = self._any_of("variants", filters.variants)
+        for label, values in filters.detail_selection().items():
+            masks["detail:" + label] = self._any_of("detail:" + label, values)
+        return masks
+
+    @staticmethod
+    def _combine(masks: Dict[str, int], start: int, skip: Optional[str] = None) -> int:
+        result = start
+        for dimension, mask in masks.items():
+            if dimension != skip:
+                result &= mask
+        return result
+
+    def positions(self, filters: ProductFilters) -> List[int]:
+        """Snapshot positions of the docs matching every filter, in order"""
+        mask = self._combine(self._dimension_masks(filters), self.all)
+        return [position for position in range(len(self.docs)) if mask >> position & 1]
+
+    def match(self, filters: ProductFilters) -> List[dict]:
+        """Docs matching every filter, in snapshot order"""
+        return [self.docs[position] for position in self.positions(filters)]
+
+    def facets(self, filters: ProductFilters) -> dict:
+        """Result total plus per-value counts for every dimension"""
+        masks = self._dimension_masks(filters)
+
+        def counts(dimension: str) -> List[dict]:
+            base = self._combine(masks, self.all, skip=dimension)
+            values = self.bitmaps.get(dimension, {})
+            return sorted(
+                ({"value": value, "count": (base & bitmap).bit_count()} for value, bitmap in values.items()),
+                key=lambda item: (-item["count"], str(item["value"])),
+            )
+
+        price_base = self._combine(masks, self.all, skip="price")
+        details = {
+            dimension.split(":", 1)[1]: counts(dimension)
+            for dimension in self.bitmaps if dimension.startswith("detail:")
+        }
+        return {
+            "total": self._combine(masks, self.all).bit_count(),
+            "facets": {
+                "category": counts("category"),
+                **{name: counts(name) for name in BOOLEAN_DIMENSIONS},
+                "price": [
+                    {"min": low, "max": high, "count": (price_base & bucket).bit_count()}
+                    for low, high, bucket in self.price_buckets
+                ],
+                "variants": counts("variants"),
+                "details": details,
+            },
+        }
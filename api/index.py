@@ -14,7 +14,10 @@ from fastapi.middleware.cors import CORSMiddleware
 from mangum import Mangum
 from motor.motor_asyncio import AsyncIOMotorClient
 from dotenv import load_dotenv
-from routes import router
+from routes import router, CART_TTL_DAYS, IDEMPOTENCY_TTL_HOURS
+from events import ORDER_EVENTS_TTL_HOURS
+from cache import catalog, data_versions
+from compression import CompressedResponseCacheMiddleware, CachedRoute
 
 load_dotenv()
 
@@ -26,6 +29,16 @@ db = client[os.environ.get('DB_NAME', 'essencia_artesanal')] if client else None
 # Create FastAPI app
 app = FastAPI(title="Essência Artesanal API")
 
+# Precompressed cache for the largest GET responses (added first so CORS wraps it)
+app.add_middleware(
+    CompressedResponseCacheMiddleware,
+    routes={
+        "/api/products": CachedRoute(version=lambda: catalog.version),
+        "/api/blog": CachedRoute(version=lambda: data_versions.get("blog")),
+        "/api/admin/orders": CachedRoute(version=lambda: data_versions.get("orders"), ttl=5, vary_auth=True),
+    },
+)
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -33,36 +46,80 @@ app.add_middleware(
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 # Include API router (all /api/* routes)
 app.include_router(router)
 
+async def ensure_index(collection, keys, **kwargs) -> bool:
+    """Create one index; a failure is logged and does not stop the others"""
+    try:
+        await collection.create_index(keys, **kwargs)
+        return True
+    except Exception as e:
+        print(f"⚠️ Failed to create index {collection.name}.{keys}: {e}")
+        return False
+
 @app.on_event("startup")
 async def startup_db_client():
-    from routes import db
-    # Create indexes for performance
-    try:
+    from routes import db, remove_duplicate_carts
+    # Create indexes for performance (each on its own, so one failure skips nothing else)
+    created = [
         # Products
-        await db.products.create_index("id", unique=True)
-        await db.products.create_index("slug", unique=True)
-        await db.products.create_index("category")
-        await db.products.create_index("store")
+        await ensure_index(db.products, "id", unique=True),
+        await ensure_index(db.products, "slug", unique=True),
+        await ensure_index(db.products, "category"),
+        await ensure_index(db.products, "store"),
+        await ensure_index(db.products, [("createdAt", -1), ("id", -1)]),  # Keyset pagination
         
         # Users
-        await db.users.create_index("id", unique=True)
-        await db.users.create_index("email", unique=True)
+        await ensure_index(db.users, "id", unique=True),
+        await ensure_index(db.users, "email", unique=True),
         
         # Orders
-        await db.orders.create_index("id", unique=True)
-        await db.orders.create_index("userId")
+        await ensure_index(db.orders, "id", unique=True),
+        # Keyset-paginated order lists (all, per customer, per status)
+        await ensure_index(db.orders, [("createdAt", -1), ("id", -1)]),
+        await ensure_index(db.orders, [("userId", 1), ("createdAt", -1), ("id", -1)]),
+        await ensure_index(db.orders, [("status", 1), ("createdAt", -1), ("id", -1)]),
         
         # Others
-        await db.categories.create_index("id", unique=True)
-        await db.reviews.create_index("productId")
+        await ensure_index(db.categories, "id", unique=True),
+        await ensure_index(db.reviews, "productId"),
+        
+        # Order Idempotency-Key records
+        await ensure_index(db.idempotency_keys, "key", unique=True),
+        
+        # Admin order event log (streams read it in seq order)
+        await ensure_index(db.order_events, "seq", unique=True),
+    ]
+    
+    # Carts (one per user; atomic cart upserts rely on this). Databases from
+    # before the index may hold duplicates: drop them and try again.
+    carts_unique = await ensure_index(db.carts, "userId", unique=True)
+    if not carts_unique:
+        try:
+            removed = await remove_duplicate_carts()
+        except Exception as e:
+            removed = 0
+            print(f"⚠️ Failed to remove duplicate carts: {e}")
+        if removed:
+            print(f"🧹 Removed {removed} duplicate carts")
+            carts_unique = await ensure_index(db.carts, "userId", unique=True)
+    created.append(carts_unique)
+    
+    # Expiring documents: abandoned carts, old idempotency keys, old order events
+    # (kept last: changing a TTL setting needs the old index dropped first)
+    created += [
+        await ensure_index(db.carts, "updatedAt", expireAfterSeconds=CART_TTL_DAYS * 24 * 60 * 60),
+        await ensure_index(db.idempotency_keys, "createdAt", expireAfterSeconds=IDEMPOTENCY_TTL_HOURS * 60 * 60),
+        await ensure_index(db.order_events, "createdAt", expireAfterSeconds=ORDER_EVENTS_TTL_HOURS * 60 * 60),
+    ]
+    if all(created):
         print("✅ Indexes created/verified!")
-    except Exception as e:
-        print(f"⚠️ Failed to create indexes: {e}")
+    else:
+        print(f"⚠️ {created.count(False)} of {len(created)} indexes could not be created")
 
 # Health check endpoint (helps prevent cold starts)
 @app.get("/")
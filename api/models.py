@@ -8,6 +8,7 @@ class ProductVariant(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     name: str  # "Brinco Normal", "Base Antialérgica", etc
     price: float  # Price for this variant
+    stock: Optional[int] = None  # Units left; None = not tracked
     
     class Config:
         from_attributes = True
@@ -30,6 +31,7 @@ class ProductBase(BaseModel):
     images: List[str]
     description: str
     inStock: bool = True
+    stock: Optional[int] = None  # Units left (variants may track their own); None = not tracked
     featured: bool = False
     isNew: bool = False
     variants: List[ProductVariant] = []  # Product variants with different prices
@@ -46,6 +48,35 @@ class Product(ProductBase):
     class Config:
         from_attributes = True
 
+# Lightweight product shape for grids/cards (GET /products?view=card)
+class ProductCard(BaseModel):
+    id: str
+    name: str
+    slug: str
+    store: Optional[str] = None
+    category: str
+    price: float
+    images: List[str] = []  # Only the cover image
+    inStock: bool = True
+    featured: bool = False
+    isNew: bool = False
+    createdAt: datetime
+
+    class Config:
+        from_attributes = True
+
+# Mongo projection matching ProductCard
+PRODUCT_CARD_PROJECTION = {
+    "_id": 0, "id": 1, "name": 1, "slug": 1, "store": 1, "category": 1,
+    "price": 1, "images": {"$slice": 1}, "inStock": 1, "featured": 1,
+    "isNew": 1, "createdAt": 1,
+}
+
+# Response of GET /products/batch
+class ProductBatch(BaseModel):
+    products: List[Product]  # In request order
+    missing: List[str] = []  # Requested ids that do not exist
+
 class CategoryBase(BaseModel):
     name: str
     slug: str
@@ -103,6 +134,7 @@ class Review(ReviewBase):
 class CartItem(BaseModel):
     productId: str
     quantity: int
+    variant: Optional[str] = None  # Variant id or name; priced at the variant's price
 
 class OrderItem(BaseModel):
     productId: str
@@ -121,6 +153,7 @@ class OrderBase(BaseModel):
     items: List[OrderItem]
     total: float
     deliveryFee: float = 0
+    deliveryZoneId: Optional[str] = None  # Delivery fee comes from this zone
     userId: Optional[str] = None
 
 class OrderCreate(OrderBase):
@@ -134,6 +167,20 @@ class Order(OrderBase):
     class Config:
         from_attributes = True
 
+# List-view shape of an order (GET /orders?view=summary, /admin/orders?view=summary)
+class OrderSummary(BaseModel):
+    id: str
+    channel: str = "web"
+    store: Optional[str] = None
+    customerName: str
+    customerPhone: str
+    total: float
+    deliveryFee: float = 0
+    itemCount: int = 0
+    userId: Optional[str] = None
+    status: str = "pending"
+    createdAt: datetime
+
 # ========== USER MODELS ==========
 
 class UserBase(BaseModel):
@@ -152,6 +199,7 @@ class UserLogin(BaseModel):
 class User(UserBase):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     passwordHash: str
+    tokenVersion: int = 0  # Bump to revoke every token issued so far
     createdAt: datetime = Field(default_factory=datetime.utcnow)
     updatedAt: datetime = Field(default_factory=datetime.utcnow)
 
@@ -163,6 +211,14 @@ class UserResponse(UserBase):
     createdAt: datetime
     isAdmin: bool
 
+# Identity carried in access token claims (no users lookup needed)
+class Principal(BaseModel):
+    id: str
+    email: str
+    name: str
+    isAdmin: bool = False
+    tokenVersion: int = 0
+
 class Token(BaseModel):
     access_token: str
     token_type: str = "bearer"
@@ -207,7 +263,9 @@ class Favorite(BaseModel):
 # ========== CART MODELS ==========
 
 class CartItemWithProduct(CartItem):
-    product: Optional[Product] = None
+    product: Optional[ProductCard] = None  # None if the product no longer exists
+    unitPrice: float = 0
+    lineTotal: float = 0
 
 class Cart(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -218,6 +276,28 @@ class Cart(BaseModel):
     class Config:
         from_attributes = True
 
+# Body of POST /cart/batch
+class CartOperation(BaseModel):
+    op: str = Field(pattern="^(add|set|remove)$")
+    productId: str
+    quantity: int = 1  # add: amount to add; set: new quantity (0 or less removes)
+    variant: Optional[str] = None
+
+class CartBatch(BaseModel):
+    operations: List[CartOperation]
+    mode: str = Field("apply", pattern="^(apply|merge)$")  # merge: adds keep the larger quantity
+
+# Anonymous cart carried in a signed token instead of the database
+class GuestCart(BaseModel):
+    items: List[CartItem] = []
+    token: str
+
+# Response of GET /cart?expand=products
+class CartWithProducts(Cart):
+    items: List[CartItemWithProduct] = []
+    itemCount: int = 0
+    subtotal: float = 0
+
 # ========== DELIVERY ZONE MODELS ==========
 
 class DeliveryZoneBase(BaseModel):
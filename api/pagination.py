@@ -0,0 +1,67 @@
+"""
+Keyset (cursor) pagination helpers
+
+Lists are ordered newest first on (createdAt, id). A cursor is the
+(createdAt, id) pair of the last row of the previous page, encoded as an
+opaque url-safe string so clients never have to build it themselves.
+"""
+import base64
+import json
+from datetime import datetime
+from typing import Optional, Tuple
+
+from fastapi import HTTPException
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+KEYSET_SORT = [("createdAt", -1), ("id", -1)]
+
+
+def encode_cursor(created_at: datetime, doc_id: str) -> str:
+    """Encode the sort key of the last row of a page as an opaque cursor"""
+    raw = json.dumps([created_at.isoformat(), doc_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    """Decode a cursor produced by encode_cursor (400 on tampered input)"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, doc_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(created_at), str(doc_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def keyset_query(query: dict, cursor: Optional[str]) -> dict:
+    """Restrict a Mongo query to rows strictly after the cursor position"""
+    if not cursor:
+        return query
+    created_at, doc_id = decode_cursor(cursor)
+    after = {"$or": [
+        {"createdAt": {"$lt": created_at}},
+        {"createdAt": created_at, "id": {"$lt": doc_id}},
+    ]}
+    return {"$and": [query, after]} if query else after
+
+
+def split_page(docs: list, limit: int) -> Tuple[list, Optional[str]]:
+    """Split docs fetched with limit + 1 into (page, next cursor or None)"""
+    if len(docs) <= limit:
+        return docs, None
+    page = docs[:limit]
+    last = page[-1]
+    return page, encode_cursor(last["createdAt"], last["id"])
+
+
+def keyset_slice(rows: list, cursor: Optional[str], limit: int) -> Tuple[list, Optional[str]]:
+    """Page through in-memory rows already sorted by (createdAt, id) descending"""
+    start = 0
+    if cursor:
+        position = decode_cursor(cursor)
+        while start < len(rows) and (rows[start]["createdAt"], rows[start]["id"]) >= position:
+            start += 1
+    page = rows[start:start + limit]
+    if start + limit >= len(rows):
+        return page, None
+    last = page[-1]
+    return page, encode_cursor(last["createdAt"], last["id"])
@@ -0,0 +1,67 @@
+"""
+In-process rate limiting for expensive endpoints
+
+TokenBucketLimiter keeps one (tokens, last refill) pair per key in an LRU
+bounded to max_keys, so a flood of distinct IPs or emails costs constant
+memory: the least recently seen keys are evicted (which only ever makes
+the limiter more lenient for them). Checks are O(1) and run before any
+password hashing or database work, so over-limit requests are cheap.
+
+Limits are per instance; with several instances each enforces its own.
+"""
+import os
+import time
+from collections import OrderedDict
+from typing import Hashable
+
+
+class TokenBucketLimiter:
+    """Allow burst requests at once per key, refilled at rate per second"""
+
+    def __init__(self, rate: float, burst: int, max_keys: int = 10000):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self.allowed = 0
+        self.limited = 0
+        self._buckets: "OrderedDict[Hashable, tuple]" = OrderedDict()
+
+    def hit(self, key: Hashable) -> float:
+        """Take one token for key; returns 0 if allowed, else seconds until one is available"""
+        now = time.monotonic()
+        tokens, last = self._buckets.get(key, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - last) * self.rate)
+        if tokens >= 1:
+            tokens -= 1
+            retry_after = 0.0
+            self.allowed += 1
+        else:
+            retry_after = (1 - tokens) / self.rate
+            self.limited += 1
+        self._buckets[key] = (tokens, now)
+        self._buckets.move_to_end(key)
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return retry_after
+
+    def stats(self) -> dict:
+        return {
+            "keys": len(self._buckets),
+            "maxKeys": self.max_keys,
+            "ratePerMinute": self.rate * 60,
+            "burst": self.burst,
+            "allowed": self.allowed,
+            "limited": self.limited,
+        }
+
+
+# Login/register attempts, per client IP and per email address
+auth_ip_limiter = TokenBucketLimiter(
+    rate=float(os.getenv("AUTH_IP_RATE_PER_MINUTE", "20")) / 60,
+    burst=int(os.getenv("AUTH_IP_BURST", "10")),
+)
+
+auth_email_limiter = TokenBucketLimiter(
+    rate=float(os.getenv("AUTH_EMAIL_RATE_PER_MINUTE", "5")) / 60,
+    burst=int(os.getenv("AUTH_EMAIL_BURST", "5")),
+)
@@ -1,24 +1,43 @@
-from fastapi import APIRouter, HTTPException, Depends, Header, UploadFile, File
-from typing import List, Optional
-from datetime import datetime
+from fastapi import APIRouter, HTTPException, Depends, Header, UploadFile, File, Query, Request, Response
+from typing import List, Optional, Tuple, Union
+from datetime import datetime, timedelta
+import hashlib
+import math
+import time
 import uuid
 import shutil
 import os
 from pathlib import Path
 from models import (
-    Product, ProductCreate, Category, CategoryCreate, Order, OrderCreate,
-    User, UserCreate, UserLogin, UserResponse, Token,
+    Product, ProductCreate, ProductCard, PRODUCT_CARD_PROJECTION, ProductBatch, ProductVariant, Category, CategoryCreate, Order, OrderCreate,
+    User, UserCreate, UserLogin, UserResponse, Token, Principal,
     Address, AddressCreate,
-    Favorite, FavoriteCreate,
-    Cart, CartItem,
+    Favorite, FavoriteCreate, OrderSummary,
+    Cart, CartItem, CartItemWithProduct, CartWithProducts, CartBatch, CartOperation, GuestCart,
     BlogPost, BlogPostCreate,
     Review, ReviewCreate,
     DeliveryZone, DeliveryZoneCreate
 )
 from motor.motor_asyncio import AsyncIOMotorClient
-import os
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
 from dotenv import load_dotenv
-from auth import get_password_hash, verify_password, create_access_token, decode_access_token
+from auth import (
+    verify_and_update_password_async, get_password_hash_async, password_pool, PasswordPoolFull,
+    create_access_token, decode_access_token, user_claims, CLAIMS_VERSION,
+    create_guest_cart_token, decode_guest_cart_token
+)
+from pagination import KEYSET_SORT, NEXT_CURSOR_HEADER, keyset_query, keyset_slice, split_page
+from fastapi.responses import StreamingResponse
+from events import order_events, sse_message
+from rate_limit import TokenBucketLimiter, auth_ip_limiter, auth_email_limiter
+from cache import catalog, data_versions, auth_tokens, auth_users, token_versions
+from search_index import search_index
+from suggest import suggestions
+from facets import FacetIndex, ProductFilters
+from compression import response_cache
+from serialization import trusted_row, trusted_rows, json_response
+from etag import weak_etag, etag_matches, not_modified, set_etag, docs_fingerprint, collection_fingerprint
 
 load_dotenv()
 
@@ -31,39 +50,255 @@ router = APIRouter(prefix="/api", tags=["api"])
 
 # ========== AUTH DEPENDENCY ==========
 
-async def get_current_user(authorization: Optional[str] = Header(None)) -> Optional[User]:
-    """Get current authenticated user from JWT token"""
+async def _token_payload(token: str) -> Optional[dict]:
+    """Decoded access token, cached until the cache TTL or the token's own expiry"""
+    payload = auth_tokens.get(token)
+    if payload is None or payload.get("exp", 0) < time.time():
+        payload = decode_access_token(token)
+        if not payload:
+            return None
+        auth_tokens.set(token, payload)
+    return payload
+
+async def load_user(user_id: str) -> Optional[User]:
+    """Full user record (cached); only needed for fields not carried in the token"""
+    user = auth_users.get(user_id)
+    if user is None:
+        user_data = await db.users.find_one({"id": user_id})
+        if not user_data:
+            return None
+        user = User(**user_data)
+        auth_users.set(user_id, user)
+    return user
+
+async def hash_password(password: str) -> str:
+    """Hash off the event loop; 503 when the password pool is saturated"""
+    try:
+        return await get_password_hash_async(password)
+    except PasswordPoolFull:
+        raise HTTPException(status_code=503, detail="Server busy, please retry", headers={"Retry-After": "1"})
+
+async def check_password(password: str, password_hash: str) -> Tuple[bool, Optional[str]]:
+    """Verify off the event loop, with a replacement hash if the stored one is outdated; 503 when saturated"""
+    try:
+        return await verify_and_update_password_async(password, password_hash)
+    except PasswordPoolFull:
+        raise HTTPException(status_code=503, detail="Server busy, please retry", headers={"Retry-After": "1"})
+
+def invalidate_user(user_id: str) -> None:
+    """Drop a cached user (call after any write to that user's record)"""
+    auth_users.pop(user_id)
+
+async def _current_token_version(user_id: str) -> Optional[int]:
+    user_data = await db.users.find_one({"id": user_id}, {"_id": 0, "tokenVersion": 1})
+    return user_data.get("tokenVersion", 0) if user_data else None
+
+async def get_current_user(authorization: Optional[str] = Header(None)) -> Optional[Principal]:
+    """Get the authenticated principal from the JWT claims"""
     if not authorization or not authorization.startswith("Bearer "):
         return None
     
-    token = authorization.replace("Bearer ", "")
-    payload = decode_access_token(token)
-    
-    if not payload:
+    payload = await _token_payload(authorization.replace("Bearer ", ""))
+    if not payload or not payload.get("sub"):
         return None
     
-    user_id = payload.get("sub")
-    if not user_id:
-        return None
+    if payload.get("cv") != CLAIMS_VERSION:
+        # Token issued before the current claim set: authorize from the user record
+        user = await load_user(payload["sub"])
+        if not user or user.tokenVersion:
+            return None  # revoking bumps tokenVersion, which also retires these tokens
+        return Principal(**user.dict())
     
-    user_data = await db.users.find_one({"id": user_id})
-    if not user_data:
+    # Revoked tokens carry an outdated version (None: user deleted)
+    if await token_versions.get(payload["sub"], _current_token_version) != payload["tv"]:
         return None
-    
-    return User(**user_data)
+    return Principal(
+        id=payload["sub"],
+        email=payload["email"],
+        name=payload["name"],
+        isAdmin=payload["role"] == "admin",
+        tokenVersion=payload["tv"],
+    )
 
-async def require_auth(user: Optional[User] = Depends(get_current_user)) -> User:
+async def require_auth(user: Optional[Principal] = Depends(get_current_user)) -> Principal:
     """Require authentication"""
     if not user:
         raise HTTPException(status_code=401, detail="Not authenticated")
     return user
 
-async def require_admin(user: User = Depends(require_auth)) -> User:
+async def require_admin(user: Principal = Depends(require_auth)) -> Principal:
     """Require admin authentication"""
     if not user.isAdmin:
         raise HTTPException(status_code=403, detail="Admin access required")
     return user
 
+# ========== CATALOG SNAPSHOT ==========
+
+def _matches_store(doc: dict, store: Optional[str]) -> bool:
+    """Products/categories without a store are shared by every store"""
+    return not store or doc.get("store") in (store, None)
+
+MAX_FILTER_VALUES = 20
+
+def _filter_values(values: Optional[List[str]], name: str) -> Tuple[str, ...]:
+    """Normalized values of a repeatable filter: trimmed, deduplicated, sorted"""
+    normalized = sorted({value.strip() for value in values or () if value.strip()})
+    if len(normalized) > MAX_FILTER_VALUES:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_FILTER_VALUES} values for {name}")
+    return tuple(normalized)
+
+def product_filters(
+    category: Optional[List[str]] = Query(None),
+    store: Optional[str] = None,
+    featured: Optional[bool] = None,
+    inStock: Optional[bool] = None,
+    isNew: Optional[bool] = None,
+    minPrice: Optional[float] = Query(None, ge=0),
+    maxPrice: Optional[float] = Query(None, ge=0),
+    detail: Optional[List[str]] = Query(None, description="Label:Value, repeatable"),
+    variant: Optional[List[str]] = Query(None),
+) -> ProductFilters:
+    """Product listing filters (repeat a parameter to OR several values).
+
+    Values are normalized so equivalent query strings share one cache entry.
+    """
+    details = []
+    for item in detail or ():
+        label, _, value = item.partition(":")
+        details.append(f"{label.strip()}:{value.strip()}")
+    return ProductFilters(
+        category=_filter_values(category, "category"),
+        store=(store or "").strip() or None,
+        featured=featured,
+        inStock=inStock,
+        isNew=isNew,
+        minPrice=minPrice,
+        maxPrice=maxPrice,
+        details=_filter_values(details, "detail"),
+        variants=_filter_values(variant, "variant"),
+    )
+
+async def _product_docs() -> List[dict]:
+    """All products, newest first (the snapshot every product view derives from)"""
+    async def load():
+        return await db.products.find({}, {"_id": 0}).sort(KEYSET_SORT).to_list(None)
+    return await catalog.view(("products",), load)
+
+async def catalog_facets() -> FacetIndex:
+    """Bitmap facet index over the catalog snapshot"""
+    async def build():
+        return FacetIndex(await _product_docs())
+    return await catalog.view(("facets",), build)
+
+async def _product_rows(view: str) -> Tuple[FacetIndex, List[dict]]:
+    """Facet index plus every product shaped for JSON in view, in the index's order"""
+    async def build():
+        index = await catalog_facets()
+        if view == "card":
+            return index, [trusted_row(ProductCard, _card_doc(doc)) for doc in index.docs]
+        return index, trusted_rows(Product, index.docs)
+    return await catalog.view(("product_rows", view), build)
+
+async def catalog_products(filters: ProductFilters, view: str = "full") -> List[dict]:
+    """Filtered product rows (shaped for JSON) served from the catalog snapshot.
+
+    Per-filter entries hold only matching positions, in the catalog's
+    bounded filtered LRU; rows are shaped once per view.
+    """
+    index, rows = await _product_rows(view)
+    async def build():
+        return index, index.positions(filters)
+    matched, positions = await catalog.filtered_view(("products", filters), build)
+    if matched is not index:
+        positions = index.positions(filters)  # cached around an invalidate(): other snapshot
+    return [rows[position] for position in positions]
+
+async def catalog_product(product_ref: str) -> Optional[Product]:
+    """Resolve a product id or slug through the snapshot's alias map"""
+    async def build():
+        aliases = {}
+        for doc in await _product_docs():
+            product = Product(**doc)
+            aliases[product.slug] = product
+            aliases[product.id] = product  # ids win over a colliding slug
+        return aliases
+    return (await catalog.view(("product_aliases",), build)).get(product_ref)
+
+async def resolve_product_id(product_ref: str) -> str:
+    """Canonical id for an id-or-slug path parameter (unchanged if unknown)"""
+    product = await catalog_product(product_ref)
+    return product.id if product else product_ref
+
+def _card_doc(doc: dict) -> dict:
+    """Product doc trimmed to its cover image"""
+    return {**doc, "images": doc.get("images", [])[:1]}
+
+def _product_card(doc: dict) -> ProductCard:
+    return ProductCard(**_card_doc(doc))
+
+async def _category_docs() -> List[dict]:
+    async def load():
+        return await db.categories.find({}, {"_id": 0}).to_list(None)
+    return await catalog.view(("categories",), load)
+
+async def catalog_categories(store: Optional[str] = None) -> List[Category]:
+    """Categories for a store served from the catalog snapshot"""
+    async def build():
+        return [Category(**doc) for doc in await _category_docs() if _matches_store(doc, store)]
+    return await catalog.filtered_view(("categories", store), build)
+
+async def catalog_etag(kind: str, *params) -> str:
+    """Weak ETag for a catalog read, computed from the snapshot (no DB access once cached)"""
+    async def build():
+        if kind == "products":
+            return docs_fingerprint(await _product_docs())
+        # Categories carry no updatedAt, so fingerprint their content instead
+        return weak_etag(*sorted(repr(sorted(doc.items())) for doc in await _category_docs()))
+    return weak_etag(kind, await catalog.view(("fingerprint", kind), build), *params)
+
+# ========== SEARCH ==========
+
+@router.get("/search", response_model=List[ProductCard])
+async def search_products(
+    q: str = Query(..., min_length=1, max_length=100),
+    store: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
+):
+    """Full-text product search (accent-insensitive, prefix-matches the last word)"""
+    if search_index.stale:
+        generation = search_index.generation
+        search_index.rebuild(await _product_docs(), generation)
+    docs = search_index.search(q, limit=limit, where=lambda doc: _matches_store(doc, store))
+    return [_product_card(doc) for doc in docs]
+
+async def _suggestion_entries() -> List[dict]:
+    """Autocomplete candidates with their popularity weights"""
+    entries = [
+        {
+            "text": doc["name"], "type": "product", "slug": doc.get("slug"),
+            "weight": 1.0 + 2.0 * doc.get("featured", False) + 0.5 * doc.get("isNew", False),
+        }
+        for doc in await _product_docs()
+    ]
+    entries += [
+        {"text": cat.name, "type": "category", "slug": cat.slug, "weight": 2.5}
+        for cat in await catalog_categories()
+    ]
+    posts = await db.blog_posts.find({"published": True}, {"_id": 0, "title": 1, "slug": 1}).to_list(None)
+    entries += [
+        {"text": post["title"], "type": "blog", "slug": post.get("slug"), "weight": 0.5}
+        for post in posts
+    ]
+    return entries
+
+@router.get("/suggest")
+async def suggest(prefix: str = Query(..., min_length=1, max_length=100), limit: int = Query(8, ge=1, le=10)):
+    """Autocomplete over product names, category names and blog titles"""
+    if suggestions.stale:
+        generation = suggestions.generation
+        suggestions.build(await _suggestion_entries(), generation)
+    return suggestions.suggest(prefix, limit)
+
 # ========== DELIVERY ZONES ==========
 
 @router.get("/delivery-fee")
@@ -96,7 +331,7 @@ async def get_public_delivery_zones():
     return zones
 
 @router.get("/admin/delivery-zones")
-async def get_delivery_zones(user: User = Depends(require_admin)):
+async def get_delivery_zones(user: Principal = Depends(require_admin)):
     """Get all delivery zones (admin)"""
     zones = []
     async for zone in db.delivery_zones.find({}):
@@ -105,7 +340,7 @@ async def get_delivery_zones(user: User = Depends(require_admin)):
     return zones
 
 @router.post("/admin/delivery-zones")
-async def create_delivery_zone(zone: DeliveryZoneCreate, user: User = Depends(require_admin)):
+async def create_delivery_zone(zone: DeliveryZoneCreate, user: Principal = Depends(require_admin)):
     """Create new delivery zone (admin)"""
     existing = await db.delivery_zones.find_one({"province": zone.province, "city": zone.city})
     if existing:
@@ -119,7 +354,7 @@ async def create_delivery_zone(zone: DeliveryZoneCreate, user: User = Depends(re
     return zone_dict
 
 @router.put("/admin/delivery-zones/{zone_id}")
-async def update_delivery_zone(zone_id: str, zone: DeliveryZoneCreate, user: User = Depends(require_admin)):
+async def update_delivery_zone(zone_id: str, zone: DeliveryZoneCreate, user: Principal = Depends(require_admin)):
     """Update delivery zone (admin)"""
     result = await db.delivery_zones.update_one({"id": zone_id}, {"$set": zone.model_dump()})
     if result.matched_count == 0:
@@ -130,7 +365,7 @@ async def update_delivery_zone(zone_id: str, zone: DeliveryZoneCreate, user: Use
     return updated
 
 @router.delete("/admin/delivery-zones/{zone_id}")
-async def delete_delivery_zone(zone_id: str, user: User = Depends(require_admin)):
+async def delete_delivery_zone(zone_id: str, user: Principal = Depends(require_admin)):
     """Delete delivery zone (admin)"""
     result = await db.delivery_zones.delete_one({"id": zone_id})
     if result.deleted_count == 0:
@@ -139,10 +374,31 @@ async def delete_delivery_zone(zone_id: str, user: User = Depends(require_admin)
 
 # ========== AUTHENTICATION ==========
 
+def client_ip(request: Request) -> str:
+    """Caller IP (first X-Forwarded-For hop when behind the Vercel proxy)"""
+    forwarded = request.headers.get("x-forwarded-for")
+    if forwarded:
+        return forwarded.split(",")[0].strip()
+    return request.client.host if request.client else "unknown"
+
+def _rate_limit(limiter: TokenBucketLimiter, key: str) -> None:
+    retry_after = limiter.hit(key)
+    if retry_after:
+        raise HTTPException(
+            status_code=429,
+            detail="Too many attempts, please try again later",
+            headers={"Retry-After": str(math.ceil(retry_after))},
+        )
+
+async def limit_auth_ip(request: Request) -> None:
+    """Per-IP limit on login/register, checked before any hashing or database work"""
+    _rate_limit(auth_ip_limiter, client_ip(request))
 
 @router.post("/auth/register", response_model=Token)
-async def register(user_data: UserCreate):
+async def register(user_data: UserCreate, x_guest_cart: Optional[str] = Header(None),
+                   _: None = Depends(limit_auth_ip)):
     """Register a new user"""
+    _rate_limit(auth_email_limiter, user_data.email.lower())
     # Check if user already exists
     existing_user = await db.users.find_one({"email": user_data.email})
     if existing_user:
@@ -150,13 +406,14 @@ async def register(user_data: UserCreate):
     
     # Create user
     user_dict = user_data.dict(exclude={"password"})
-    user_dict["passwordHash"] = get_password_hash(user_data.password)
+    user_dict["passwordHash"] = await hash_password(user_data.password)
     user = User(**user_dict)
     
     await db.users.insert_one(user.dict())
+    await promote_guest_cart(user.id, x_guest_cart)
     
     # Create access token
-    access_token = create_access_token(data={"sub": user.id})
+    access_token = create_access_token(data=user_claims(user))
     
     user_response = UserResponse(
         id=user.id,
@@ -170,8 +427,10 @@ async def register(user_data: UserCreate):
     return Token(access_token=access_token, user=user_response)
 
 @router.post("/auth/login", response_model=Token)
-async def login(credentials: UserLogin):
+async def login(credentials: UserLogin, x_guest_cart: Optional[str] = Header(None),
+                _: None = Depends(limit_auth_ip)):
     """Login a user"""
+    _rate_limit(auth_email_limiter, credentials.email.lower())
     # Find user
     user_data = await db.users.find_one({"email": credentials.email})
     if not user_data:
@@ -180,11 +439,17 @@ async def login(credentials: UserLogin):
     user = User(**user_data)
     
     # Verify password
-    if not verify_password(credentials.password, user.passwordHash):
+    valid, new_hash = await check_password(credentials.password, user.passwordHash)
+    if not valid:
         raise HTTPException(status_code=401, detail="Invalid credentials")
+    if new_hash:
+        # Stored hash uses an old scheme or cost: replace it while we have the password
+        await db.users.update_one({"id": user.id}, {"$set": {"passwordHash": new_hash, "updatedAt": datetime.utcnow()}})
+        invalidate_user(user.id)
+    await promote_guest_cart(user.id, x_guest_cart)
     
     # Create access token
-    access_token = create_access_token(data={"sub": user.id})
+    access_token = create_access_token(data=user_claims(user))
     
     user_response = UserResponse(
         id=user.id,
@@ -198,8 +463,11 @@ async def login(credentials: UserLogin):
     return Token(access_token=access_token, user=user_response)
 
 @router.get("/auth/me", response_model=UserResponse)
-async def get_me(user: User = Depends(require_auth)):
+async def get_me(principal: Principal = Depends(require_auth)):
     """Get current user"""
+    user = await load_user(principal.id)
+    if not user:
+        raise HTTPException(status_code=401, detail="Not authenticated")
     return UserResponse(
         id=user.id,
         email=user.email,
@@ -212,13 +480,13 @@ async def get_me(user: User = Depends(require_auth)):
 # ========== ADDRESSES ==========
 
 @router.get("/addresses", response_model=List[Address])
-async def get_addresses(user: User = Depends(require_auth)):
+async def get_addresses(user: Principal = Depends(require_auth)):
     """Get all addresses for current user"""
     addresses = await db.addresses.find({"userId": user.id}).to_list(100)
     return [Address(**addr) for addr in addresses]
 
 @router.post("/addresses", response_model=Address)
-async def create_address(address_data: AddressCreate, user: User = Depends(require_auth)):
+async def create_address(address_data: AddressCreate, user: Principal = Depends(require_auth)):
     """Create a new address"""
     address_dict = address_data.dict()
     address_dict["userId"] = user.id
@@ -235,7 +503,7 @@ async def create_address(address_data: AddressCreate, user: User = Depends(requi
     return address
 
 @router.put("/addresses/{address_id}", response_model=Address)
-async def update_address(address_id: str, address_data: AddressCreate, user: User = Depends(require_auth)):
+async def update_address(address_id: str, address_data: AddressCreate, user: Principal = Depends(require_auth)):
     """Update an address"""
     # Check if address belongs to user
     existing = await db.addresses.find_one({"id": address_id, "userId": user.id})
@@ -260,7 +528,7 @@ async def update_address(address_id: str, address_data: AddressCreate, user: Use
     return Address(**updated)
 
 @router.delete("/addresses/{address_id}")
-async def delete_address(address_id: str, user: User = Depends(require_auth)):
+async def delete_address(address_id: str, user: Principal = Depends(require_auth)):
     """Delete an address"""
     result = await db.addresses.delete_one({"id": address_id, "userId": user.id})
     if result.deleted_count == 0:
@@ -270,7 +538,7 @@ async def delete_address(address_id: str, user: User = Depends(require_auth)):
 # ========== FAVORITES ==========
 
 @router.get("/favorites", response_model=List[Product])
-async def get_favorites(user: User = Depends(require_auth)):
+async def get_favorites(user: Principal = Depends(require_auth)):
     """Get all favorite products for current user"""
     favorites = await db.favorites.find({"userId": user.id}).to_list(1000)
     product_ids = [fav["productId"] for fav in favorites]
@@ -279,10 +547,10 @@ async def get_favorites(user: User = Depends(require_auth)):
         return []
     
     products = await db.products.find({"id": {"$in": product_ids}}).to_list(1000)
-    return [Product(**prod) for prod in products]
+    return json_response(trusted_rows(Product, products))
 
 @router.post("/favorites", response_model=Favorite)
-async def add_favorite(favorite_data: FavoriteCreate, user: User = Depends(require_auth)):
+async def add_favorite(favorite_data: FavoriteCreate, user: Principal = Depends(require_auth)):
     """Add a product to favorites"""
     # Check if already favorited
     existing = await db.favorites.find_one({"userId": user.id, "productId": favorite_data.productId})
@@ -299,7 +567,7 @@ async def add_favorite(favorite_data: FavoriteCreate, user: User = Depends(requi
     return favorite
 
 @router.delete("/favorites/{product_id}")
-async def remove_favorite(product_id: str, user: User = Depends(require_auth)):
+async def remove_favorite(product_id: str, user: Principal = Depends(require_auth)):
     """Remove a product from favorites"""
     result = await db.favorites.delete_one({"userId": user.id, "productId": product_id})
     if result.deleted_count == 0:
@@ -307,150 +575,362 @@ async def remove_favorite(product_id: str, user: User = Depends(require_auth)):
     return {"message": "Favorite removed successfully"}
 
 @router.get("/favorites/check/{product_id}")
-async def check_favorite(product_id: str, user: User = Depends(require_auth)):
+async def check_favorite(product_id: str, user: Principal = Depends(require_auth)):
     """Check if a product is favorited"""
     favorite = await db.favorites.find_one({"userId": user.id, "productId": product_id})
     return {"isFavorite": favorite is not None}
 
 # ========== CART ==========
 
-@router.get("/cart", response_model=Cart)
-async def get_cart(user: User = Depends(require_auth)):
+# Carts untouched for this long are removed by a TTL index on updatedAt
+CART_TTL_DAYS = int(os.getenv("CART_TTL_DAYS", "60"))
+
+def _variant(product: Product, variant_ref: Optional[str]) -> Optional[ProductVariant]:
+    """The product's variant with this id or name (None if there is none)"""
+    for option in product.variants or []:
+        if variant_ref in (option.id, option.name):
+            return option
+    return None
+
+def _unit_price(product: Product, variant: Optional[str]) -> Optional[float]:
+    """Price of the chosen variant (by id or name), the product price if none
+    was chosen, or None if the product has no such variant"""
+    if not variant:
+        return product.price
+    option = _variant(product, variant)
+    return option.price if option else None
+
+def _cart_variant(product: Product, variant_ref: Optional[str]) -> Optional[str]:
+    """Canonical variant of a cart line (its name); 400 for an unknown variant"""
+    if not variant_ref:
+        return None
+    option = _variant(product, variant_ref)
+    if option is None:
+        raise HTTPException(status_code=400, detail=f"Variant not found: {variant_ref}")
+    return option.name
+
+def _line_key(item: dict) -> tuple:
+    """Cart lines are one per (product, variant)"""
+    return item["productId"], item.get("variant")
+
+async def hydrate_cart(cart: Cart) -> CartWithProducts:
+    """Cart with product cards, line totals and subtotal from the catalog snapshot"""
+    items = []
+    for item in cart.items:
+        product = await catalog_product(item.productId)
+        unit_price = _unit_price(product, item.variant) if product else None
+        if unit_price is None:
+            # Product or variant removed since: listed, but not priced or counted
+            items.append(CartItemWithProduct(**item.dict()))
+            continue
+        items.append(CartItemWithProduct(
+            **item.dict(),
+            product=_product_card(product.dict()),
+            unitPrice=unit_price,
+            lineTotal=round(unit_price * item.quantity, 2),
+        ))
+    return CartWithProducts(
+        **cart.dict(exclude={"items"}),
+        items=items,
+        itemCount=sum(item.quantity for item in items if item.product),
+        subtotal=round(sum(item.lineTotal for item in items), 2),
+    )
+
+@router.get("/cart", response_model=Union[CartWithProducts, Cart])
+async def get_cart(
+    expand: Optional[str] = Query(None, pattern="^products$", description="'products' adds product cards and totals"),
+    user: Principal = Depends(require_auth),
+):
     """Get current user's cart"""
     cart = await db.carts.find_one({"userId": user.id})
-    if not cart:
-        # Create empty cart
-        cart = Cart(userId=user.id, items=[])
-        await db.carts.insert_one(cart.dict())
-    return Cart(**cart)
-
-@router.post("/cart/items")
-async def add_to_cart(item: CartItem, user: User = Depends(require_auth)):
-    """Add an item to cart"""
-    # Check if product exists
-    product = await db.products.find_one({"id": item.productId})
+    # No cart yet: answer with an empty one; it is stored on the first write
+    cart = Cart(**cart) if cart else Cart(userId=user.id, items=[])
+    if expand == "products":
+        return await hydrate_cart(cart)
+    return cart
+
+@router.post("/cart/items", response_model=Cart)
+async def add_to_cart(item: CartItem, user: Principal = Depends(require_auth)):
+    """Add an item to cart (atomic; concurrent adds never lose quantities)"""
+    if item.quantity < 1:
+        raise HTTPException(status_code=400, detail="Quantity must be at least 1")
+    product = await catalog_product(item.productId)
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
+    item = CartItem(productId=product.id, quantity=item.quantity, variant=_cart_variant(product, item.variant))
+    line = {"productId": item.productId, "variant": item.variant}
+    
+    now = datetime.utcnow()
+    for _ in range(3):
+        # Already in the cart: bump its quantity in place
+        cart = await db.carts.find_one_and_update(
+            {"userId": user.id, "items": {"$elemMatch": line}},
+            {"$inc": {"items.$.quantity": item.quantity}, "$set": {"updatedAt": now}},
+            return_document=ReturnDocument.AFTER,
+        )
+        if cart:
+            return Cart(**cart)
+        
+        # Not in the cart (or no cart yet): append it, creating the cart if needed
+        try:
+            cart = await db.carts.find_one_and_update(
+                {"userId": user.id, "items": {"$not": {"$elemMatch": line}}},
+                {
+                    "$push": {"items": item.dict()},
+                    "$set": {"updatedAt": now},
+                    "$setOnInsert": {"id": str(uuid.uuid4())},
+                },
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+            return Cart(**cart)
+        except DuplicateKeyError:
+            # A concurrent request added the item (or created the cart) first
+            continue
+    
+    raise HTTPException(status_code=409, detail="Cart is being modified, please retry")
+
+MAX_CART_OPERATIONS = 100
+
+def _apply_cart_operations(items: List[dict], batch: CartBatch) -> List[dict]:
+    """New cart items after applying batch to items (input is not modified)"""
+    lines = {_line_key(item): dict(item) for item in items}
+    for operation in batch.operations:
+        key = (operation.productId, operation.variant)
+        line = lines.get(key)
+        if operation.op == "remove" or (operation.op == "set" and operation.quantity <= 0):
+            lines.pop(key, None)
+        elif operation.op == "set":
+            line = lines.setdefault(key, CartItem(**operation.dict(exclude={"op"})).dict())
+            line["quantity"] = operation.quantity
+        elif line is None:
+            lines[key] = CartItem(**operation.dict(exclude={"op"})).dict()
+        elif batch.mode == "merge":
+            # The same guest cart may be merged more than once; never double it
+            line["quantity"] = max(line["quantity"], operation.quantity)
+        else:
+            line["quantity"] += operation.quantity
+    return list(lines.values())
+
+async def _checked_operations(batch: CartBatch) -> CartBatch:
+    """batch with product refs resolved against the catalog (merge mode drops unknown ones)"""
+    if len(batch.operations) > MAX_CART_OPERATIONS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_CART_OPERATIONS} operations per request")
+    
+    operations = []
+    for operation in batch.operations:
+        if operation.op == "add" and operation.quantity < 1:
+            raise HTTPException(status_code=400, detail="Quantity must be at least 1")
+        if operation.op == "remove" or (operation.op == "set" and operation.quantity <= 0):
+            # Removals match the stored line, even one whose product or variant is gone
+            line = await _cart_line_ref(operation.productId, operation.variant)
+            operations.append(CartOperation(**{**operation.dict(), **line}))
+            continue
+        product = await catalog_product(operation.productId)
+        if product:
+            # Lines are keyed by product id and variant name, whichever refs the client sent
+            try:
+                variant = _cart_variant(product, operation.variant)
+            except HTTPException:
+                if batch.mode == "merge":
+                    continue  # the variant was removed since
+                raise
+            operation = CartOperation(**{**operation.dict(), "productId": product.id, "variant": variant})
+        elif batch.mode == "merge":
+            continue  # guest carts may hold products removed since
+        else:
+            raise HTTPException(status_code=404, detail=f"Product not found: {operation.productId}")
+        operations.append(operation)
+    return CartBatch(operations=operations, mode=batch.mode)
+
+async def write_cart_operations(user_id: str, batch: CartBatch) -> Cart:
+    """Apply a checked batch to a user's persisted cart in one write"""
+    for _ in range(3):
+        cart = await db.carts.find_one({"userId": user_id})
+        now = datetime.utcnow()
+        if cart is None:
+            cart = Cart(userId=user_id, items=_apply_cart_operations([], batch), updatedAt=now).dict()
+            try:
+                await db.carts.insert_one(cart)
+            except DuplicateKeyError:
+                continue  # created concurrently; apply on top of it
+            return Cart(**cart)
+        
+        # Compare-and-set on the items we read: a concurrent change makes this a no-op and we retry
+        items = _apply_cart_operations(cart["items"], batch)
+        result = await db.carts.update_one(
+            {"userId": user_id, "items": cart["items"]},
+            {"$set": {"items": items, "updatedAt": now}},
+        )
+        if result.matched_count:
+            return Cart(**{**cart, "items": items, "updatedAt": now})
     
-    # Get or create cart
-    cart = await db.carts.find_one({"userId": user.id})
-    if not cart:
-        cart = Cart(userId=user.id, items=[])
-        await db.carts.insert_one(cart.dict())
-        cart = await db.carts.find_one({"userId": user.id})
-    
-    # Check if item already in cart
-    items = cart.get("items", [])
-    item_exists = False
-    
-    for i, cart_item in enumerate(items):
-        if cart_item["productId"] == item.productId:
-            items[i]["quantity"] += item.quantity
-            item_exists = True
-            break
-    
-    if not item_exists:
-        items.append(item.dict())
-    
-    # Update cart
-    from datetime import datetime
-    await db.carts.update_one(
-        {"userId": user.id},
-        {"$set": {"items": items, "updatedAt": datetime.utcnow()}}
-    )
-    
-    updated_cart = await db.carts.find_one({"userId": user.id})
-    return Cart(**updated_cart)
+    raise HTTPException(status_code=409, detail="Cart is being modified, please retry")
 
-@router.put("/cart/items/{product_id}")
-async def update_cart_item(product_id: str, quantity: int, user: User = Depends(require_auth)):
-    """Update item quantity in cart"""
-    cart = await db.carts.find_one({"userId": user.id})
+@router.post("/cart/batch", response_model=Cart)
+async def batch_cart(batch: CartBatch, user: Principal = Depends(require_auth)):
+    """Apply several add/set/remove operations to the cart in one write (merge mode for login)"""
+    return await write_cart_operations(user.id, await _checked_operations(batch))
+
+async def _cart_line_ref(product_ref: str, variant_ref: Optional[str]) -> dict:
+    """{productId, variant} of an existing line, from an id-or-slug and variant id-or-name"""
+    product = await catalog_product(product_ref)
+    if not product:
+        return {"productId": product_ref, "variant": variant_ref or None}  # deleted since: match as stored
+    option = _variant(product, variant_ref) if variant_ref else None
+    return {"productId": product.id, "variant": option.name if option else variant_ref or None}
+
+@router.put("/cart/items/{product_id}", response_model=Cart)
+async def update_cart_item(product_id: str, quantity: int, variant: Optional[str] = None,
+                           user: Principal = Depends(require_auth)):
+    """Update the quantity of one cart line (product and variant; 0 or less removes it)"""
+    line = await _cart_line_ref(product_id, variant)
+    if quantity <= 0:
+        update = {"$pull": {"items": line}, "$set": {"updatedAt": datetime.utcnow()}}
+    else:
+        update = {"$set": {"items.$.quantity": quantity, "updatedAt": datetime.utcnow()}}
+    
+    cart = await db.carts.find_one_and_update(
+        {"userId": user.id, "items": {"$elemMatch": line}},
+        update,
+        return_document=ReturnDocument.AFTER,
+    )
     if not cart:
-        raise HTTPException(status_code=404, detail="Cart not found")
-    
-    items = cart.get("items", [])
-    item_found = False
-    
-    for i, item in enumerate(items):
-        if item["productId"] == product_id:
-            if quantity <= 0:
-                items.pop(i)
-            else:
-                items[i]["quantity"] = quantity
-            item_found = True
-            break
-    
-    if not item_found:
         raise HTTPException(status_code=404, detail="Item not in cart")
-    
-    from datetime import datetime
-    await db.carts.update_one(
-        {"userId": user.id},
-        {"$set": {"items": items, "updatedAt": datetime.utcnow()}}
-    )
-    
-    updated_cart = await db.carts.find_one({"userId": user.id})
-    return Cart(**updated_cart)
+    return Cart(**cart)
 
 @router.delete("/cart/items/{product_id}")
-async def remove_from_cart(product_id: str, user: User = Depends(require_auth)):
-    """Remove an item from cart"""
-    cart = await db.carts.find_one({"userId": user.id})
-    if not cart:
-        raise HTTPException(status_code=404, detail="Cart not found")
-    
-    items = cart.get("items", [])
-    items = [item for item in items if item["productId"] != product_id]
-    
-    from datetime import datetime
-    await db.carts.update_one(
+async def remove_from_cart(product_id: str, variant: Optional[str] = None, user: Principal = Depends(require_auth)):
+    """Remove one cart line (product and variant)"""
+    cart = await db.carts.find_one_and_update(
         {"userId": user.id},
-        {"$set": {"items": items, "updatedAt": datetime.utcnow()}}
+        {"$pull": {"items": await _cart_line_ref(product_id, variant)}, "$set": {"updatedAt": datetime.utcnow()}},
+        projection={"_id": 1},
     )
+    if not cart:
+        raise HTTPException(status_code=404, detail="Cart not found")
     
     return {"message": "Item removed from cart"}
 
 @router.delete("/cart")
-async def clear_cart(user: User = Depends(require_auth)):
+async def clear_cart(user: Principal = Depends(require_auth)):
     """Clear all items from cart"""
     await db.carts.update_one(
         {"userId": user.id},
-        {"$set": {"items": []}}
+        {"$set": {"items": [], "updatedAt": datetime.utcnow()}}
     )
     return {"message": "Cart cleared successfully"}
 
+# ========== GUEST CART ==========
+# Anonymous carts live entirely in a signed token: each response carries the
+# new token in its body ("token") and the client sends it back in the
+# X-Guest-Cart request header. The routes below never touch the database.
+# The cart is persisted only when the shopper logs in or registers with the
+# header set (see promote_guest_cart).
+
+async def guest_cart_items(x_guest_cart: Optional[str] = Header(None)) -> List[dict]:
+    """Items of the guest cart sent in the X-Guest-Cart header (empty if none)"""
+    if not x_guest_cart:
+        return []
+    items = decode_guest_cart_token(x_guest_cart)
+    if items is None:
+        raise HTTPException(status_code=400, detail="Invalid or expired guest cart")
+    return items
+
+def _guest_cart(items: List[dict]) -> GuestCart:
+    if len(items) > MAX_CART_OPERATIONS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_CART_OPERATIONS} items per cart")
+    return GuestCart(items=items, token=create_guest_cart_token(items))
+
+@router.get("/cart/guest", response_model=GuestCart)
+async def get_guest_cart(items: List[dict] = Depends(guest_cart_items)):
+    """Get the guest cart (a fresh token if none was sent)"""
+    return _guest_cart(items)
+
+@router.post("/cart/guest/items", response_model=GuestCart)
+async def add_to_guest_cart(item: CartItem, items: List[dict] = Depends(guest_cart_items)):
+    """Add an item to the guest cart; returns the updated cart and its new token"""
+    batch = await _checked_operations(CartBatch(operations=[CartOperation(op="add", **item.dict())]))
+    return _guest_cart(_apply_cart_operations(items, batch))
+
+@router.post("/cart/guest/batch", response_model=GuestCart)
+async def batch_guest_cart(batch: CartBatch, items: List[dict] = Depends(guest_cart_items)):
+    """Apply add/set/remove operations to the guest cart; returns the new token"""
+    return _guest_cart(_apply_cart_operations(items, await _checked_operations(batch)))
+
+async def promote_guest_cart(user_id: str, token: Optional[str]) -> None:
+    """Merge a guest cart token into the user's persisted cart.
+
+    Never raises: invalid or expired tokens are ignored, and a merge that
+    fails (cart busy, bad line) is logged so the login still succeeds.
+    """
+    items = decode_guest_cart_token(token) if token else None
+    if not items:
+        return
+    try:
+        operations = [CartOperation(op="add", **item) for item in items[:MAX_CART_OPERATIONS]]
+        await write_cart_operations(user_id, await _checked_operations(CartBatch(operations=operations, mode="merge")))
+    except Exception as e:
+        detail = e.detail if isinstance(e, HTTPException) else e
+        print(f"⚠️ Guest cart not merged for user {user_id}: {detail}")
+
 # ========== PRODUCTS ==========
 
-@router.get("/products/{product_id}", response_model=Product)
-async def get_product_by_id(product_id: str):
-    """Get a single product by ID"""
-    product = await db.products.find_one({"id": product_id})
+@router.get("/products/facets")
+async def get_product_facets(filters: ProductFilters = Depends(product_filters)):
+    """Result count and per-value facet counts for the given filters"""
+    return (await catalog_facets()).facets(filters)
+
+MAX_BATCH_IDS = 100
+
+@router.get("/products/batch", response_model=ProductBatch)
+async def get_products_batch(ids: str = Query(..., description="Comma-separated product ids or slugs")):
+    """Get several products in one call, in request order"""
+    refs = list(dict.fromkeys(ref.strip() for ref in ids.split(",") if ref.strip()))
+    if len(refs) > MAX_BATCH_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_IDS} ids per request")
+    
+    products, missing = [], []
+    for ref in refs:
+        product = await catalog_product(ref)
+        if product:
+            products.append(product)
+        else:
+            missing.append(ref)
+    return ProductBatch(products=products, missing=missing)
+
+@router.get("/products/{product_ref}", response_model=Product)
+async def get_product(product_ref: str):
+    """Get a single product by ID or slug"""
+    product = await catalog_product(product_ref)
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
-    return Product(**product)
+    return product
 
 # ========== CATEGORIES ==========
 
 @router.get("/categories", response_model=List[Category])
-async def get_categories(store: Optional[str] = None):
+async def get_categories(response: Response, store: Optional[str] = None,
+                         if_none_match: Optional[str] = Header(None)):
     """Get all categories"""
-    query: dict = {}
-    if store:
-        query["$or"] = [{"store": store}, {"store": {"$exists": False}}, {"store": None}]
-    categories = await db.categories.find(query).to_list(100)
-    return [Category(**cat) for cat in categories]
+    etag = await catalog_etag("categories", store)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    set_etag(response, etag)
+    return await catalog_categories(store)
 
 @router.post("/categories", response_model=Category)
-async def create_category(category: CategoryCreate, admin: User = Depends(require_admin)):
+async def create_category(category: CategoryCreate, admin: Principal = Depends(require_admin)):
     """Create a new category (admin only)"""
     category_dict = category.dict()
     cat_obj = Category(**category_dict)
     await db.categories.insert_one(cat_obj.dict())
+    catalog.invalidate()
+    suggestions.mark_dirty()
     return cat_obj
 
 @router.put("/categories/{category_id}", response_model=Category)
-async def update_category(category_id: str, category: CategoryCreate, admin: User = Depends(require_admin)):
+async def update_category(category_id: str, category: CategoryCreate, admin: Principal = Depends(require_admin)):
     """Update a category (admin only)"""
     category_dict = category.dict()
     
@@ -461,90 +941,182 @@ async def update_category(category_id: str, category: CategoryCreate, admin: Use
     
     if result.modified_count == 0:
         raise HTTPException(status_code=404, detail="Category not found")
+    catalog.invalidate()
+    suggestions.mark_dirty()
     
     updated_category = await db.categories.find_one({"id": category_id})
     return Category(**updated_category)
 
 @router.delete("/categories/{category_id}")
-async def delete_category(category_id: str, admin: User = Depends(require_admin)):
+async def delete_category(category_id: str, admin: Principal = Depends(require_admin)):
     """Delete a category (admin only)"""
     result = await db.categories.delete_one({"id": category_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Category not found")
+    catalog.invalidate()
+    suggestions.mark_dirty()
     return {"message": "Category deleted successfully"}
 
 # ========== PRODUCTS ==========
 
-@router.get("/products", response_model=List[Product])
-async def get_products(category: Optional[str] = None, featured: Optional[bool] = None, store: Optional[str] = None):
-    """Get all products with optional filters"""
-    query = {}
-    if category:
-        query['category'] = category
-    if featured is not None:
-        query['featured'] = featured
-    if store:
-        query['$or'] = [{"store": store}, {"store": {"$exists": False}}, {"store": None}]
-    
-    products = await db.products.find(query).to_list(1000)
-    return [Product(**product) for product in products]
-
-@router.get("/products/{slug}", response_model=Product)
-async def get_product(slug: str):
-    """Get a single product by slug"""
-    product = await db.products.find_one({"slug": slug})
-    if not product:
-        raise HTTPException(status_code=404, detail="Product not found")
-    return Product(**product)
+async def db_products_page(filters: ProductFilters, view: str, limit: int,
+                           cursor: Optional[str]) -> Tuple[List[dict], Optional[str]]:
+    """One keyset page read straight from the database (card view projected server-side)"""
+    projection = PRODUCT_CARD_PROJECTION if view == "card" else {"_id": 0}
+    docs = await db.products.find(keyset_query(filters.mongo_query(), cursor), projection) \
+        .sort(KEYSET_SORT).limit(limit + 1).to_list(limit + 1)
+    docs, next_cursor = split_page(docs, limit)
+    return trusted_rows(ProductCard if view == "card" else Product, docs), next_cursor
+
+@router.get("/products", response_model=List[Union[ProductCard, Product]])
+async def get_products(
+    response: Response,
+    filters: ProductFilters = Depends(product_filters),
+    view: str = Query("full", pattern="^(card|full)$"),
+    limit: int = Query(1000, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None),
+):
+    """Get products with optional filters, newest first.
+
+    Keyset paginated on (createdAt, id): pass the X-Next-Cursor response
+    header back as ?cursor= to fetch the next page. view=card fetches and
+    returns only the fields product grids render. Served from the
+    in-memory catalog snapshot once it is loaded; until then each page is
+    one indexed, projected query so a cold instance never loads the whole
+    catalog just to answer it.
+    """
+    snapshot = catalog.cached(("products",))
+    if snapshot:
+        etag = await catalog_etag("products", filters, view, limit, cursor)
+    else:
+        # The fingerprint the snapshot would give, in one aggregate
+        etag = weak_etag("products", await collection_fingerprint(db.products, {}), filters, view, limit, cursor)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    set_etag(response, etag)
+    
+    if snapshot:
+        page, next_cursor = keyset_slice(await catalog_products(filters, view), cursor, limit)
+    else:
+        page, next_cursor = await db_products_page(filters, view, limit, cursor)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return json_response(page, response)
 
 @router.post("/products", response_model=Product)
-async def create_product(product: ProductCreate, admin: User = Depends(require_admin)):
+async def create_product(product: ProductCreate, admin: Principal = Depends(require_admin)):
     """Create a new product (admin only)"""
     product_dict = product.dict()
     product_obj = Product(**product_dict)
     await db.products.insert_one(product_obj.dict())
+    catalog.invalidate()
+    suggestions.mark_dirty()
+    search_index.upsert(product_obj.dict())
     return product_obj
 
+def _variants_keeping_stock(variants: List[ProductVariant], stored: List[dict]) -> List[dict]:
+    """Variants for a product update; each keeps its stored stock unless the request set it"""
+    by_id = {variant.get("id"): variant for variant in stored}
+    by_name = {variant.get("name"): variant for variant in stored}
+    rows = []
+    for variant in variants:
+        row = variant.dict()
+        if "stock" not in variant.model_fields_set:
+            current = by_id.get(variant.id) or by_name.get(variant.name)
+            row["stock"] = current.get("stock") if current else None
+        rows.append(row)
+    return rows
+
 @router.put("/products/{product_id}", response_model=Product)
-async def update_product(product_id: str, product: ProductCreate, admin: User = Depends(require_admin)):
-    """Update a product (admin only)"""
-    from datetime import datetime
-    product_dict = product.dict()
-    product_dict['updatedAt'] = datetime.utcnow()
-    
-    result = await db.products.update_one(
-        {"id": product_id},
-        {"$set": product_dict}
-    )
-    
-    if result.modified_count == 0:
-        raise HTTPException(status_code=404, detail="Product not found")
+async def update_product(product_id: str, product: ProductCreate, admin: Principal = Depends(require_admin)):
+    """Update a product (admin only).
+
+    Stock is written only when the request sets it: the admin form strips
+    stock (product and variants) before saving, since writing back what it
+    loaded would undo reservations made since. The variants list is replaced by compare-and-set on the stored
+    one, so each variant keeps its current stock.
+    """
+    product_dict = product.dict(exclude={"stock", "variants"})
+    for _ in range(3):
+        stored = await db.products.find_one({"id": product_id}, {"_id": 0, "stock": 1, "inStock": 1, "variants": 1})
+        if not stored:
+            raise HTTPException(status_code=404, detail="Product not found")
+        update = {
+            **product_dict,
+            "variants": _variants_keeping_stock(product.variants, stored.get("variants") or []),
+            "updatedAt": datetime.utcnow(),
+        }
+        if "stock" in product.model_fields_set:
+            update["stock"] = product.stock
+        elif stored.get("stock") is not None:
+            update["inStock"] = stored.get("inStock", True)  # tracked stock owns the flag
+        
+        result = await db.products.update_one(
+            {"id": product_id, "stock": stored.get("stock"), "variants": stored.get("variants")},
+            {"$set": update}
+        )
+        if result.matched_count:
+            break
+    else:
+        raise HTTPException(status_code=409, detail="Product stock changed while saving, please retry")
+    catalog.invalidate()
+    suggestions.mark_dirty()
     
     updated_product = await db.products.find_one({"id": product_id})
+    search_index.upsert(updated_product)
     return Product(**updated_product)
 
 @router.delete("/products/{product_id}")
-async def delete_product(product_id: str, admin: User = Depends(require_admin)):
+async def delete_product(product_id: str, admin: Principal = Depends(require_admin)):
     """Delete a product (admin only)"""
     result = await db.products.delete_one({"id": product_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Product not found")
+    catalog.invalidate()
+    suggestions.mark_dirty()
+    search_index.remove(product_id)
     return {"message": "Product deleted successfully"}
 
 # ========== ORDERS ==========
 
-@router.get("/orders", response_model=List[Order])
-async def get_orders(user: Optional[User] = Depends(get_current_user)):
+ORDER_SUMMARY_PROJECTION = {
+    "_id": 0, "id": 1, "channel": 1, "store": 1, "customerName": 1, "customerPhone": 1,
+    "total": 1, "deliveryFee": 1, "userId": 1, "status": 1, "createdAt": 1,
+    "itemCount": {"$size": "$items"},
+}
+
+async def list_orders(query: dict, response: Response, view: str, limit: int, cursor: Optional[str]) -> Response:
+    """One keyset page of orders, newest first (backed by the compound createdAt/id indexes)"""
+    pipeline = [
+        {"$match": keyset_query(query, cursor)},
+        {"$sort": dict(KEYSET_SORT)},
+        {"$limit": limit + 1},
+    ]
+    if view == "summary":
+        pipeline.append({"$project": ORDER_SUMMARY_PROJECTION})
+    orders, next_cursor = split_page(await db.orders.aggregate(pipeline).to_list(None), limit)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return json_response(trusted_rows(OrderSummary if view == "summary" else Order, orders), response)
+
+@router.get("/orders", response_model=List[Union[OrderSummary, Order]])
+async def get_orders(
+    response: Response,
+    view: str = Query("full", pattern="^(summary|full)$"),
+    limit: int = Query(1000, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    user: Optional[Principal] = Depends(get_current_user),
+):
     """Get all orders (filtered by user if authenticated)"""
     query = {}
     if user:
         query["userId"] = user.id
     
-    orders = await db.orders.find(query).sort("createdAt", -1).to_list(1000)
-    return [Order(**order) for order in orders]
+    return await list_orders(query, response, view, limit, cursor)
 
 @router.get("/orders/{order_id}", response_model=Order)
-async def get_order(order_id: str, user: Optional[User] = Depends(get_current_user)):
+async def get_order(order_id: str, user: Optional[Principal] = Depends(get_current_user)):
     """Get a single order by ID"""
     query = {"id": order_id}
     if user:
@@ -555,59 +1127,297 @@ async def get_order(order_id: str, user: Optional[User] = Depends(get_current_us
         raise HTTPException(status_code=404, detail="Order not found")
     return Order(**order)
 
-@router.post("/orders", response_model=Order)
-async def create_order(order: OrderCreate, user: Optional[User] = Depends(get_current_user)):
-    """Create a new order"""
-    order_dict = order.dict()
-    if user:
-        order_dict["userId"] = user.id
+PRICE_TOLERANCE = 0.01
+
+async def price_order(order: OrderCreate) -> dict:
+    """Order dict with item prices, delivery fee and total computed server-side.
+
+    Products come from the catalog snapshot and the fee from the order's
+    delivery zone; a client total that disagrees is rejected.
+    """
+    if not order.items:
+        raise HTTPException(status_code=400, detail="Order has no items")
+    
+    items, subtotal = [], 0.0
+    for item in order.items:
+        if item.quantity < 1:
+            raise HTTPException(status_code=400, detail="Quantity must be at least 1")
+        product = await catalog_product(item.productId)
+        if not product:
+            raise HTTPException(status_code=400, detail=f"Product not found: {item.productId}")
+        price = _unit_price(product, item.variant)
+        if price is None:
+            raise HTTPException(status_code=400, detail=f"Variant not found for {product.name}: {item.variant}")
+        items.append({**item.dict(), "productId": product.id, "productName": product.name, "price": price})
+        subtotal += price * item.quantity
+    
+    delivery_fee = 0.0
+    if order.deliveryZoneId:
+        zone = await db.delivery_zones.find_one({"id": order.deliveryZoneId, "isActive": True}, {"_id": 0, "fee": 1})
+        if not zone:
+            raise HTTPException(status_code=400, detail="Delivery zone not available")
+        delivery_fee = zone.get("fee", 0)
+    
+    total = round(subtotal + delivery_fee, 2)
+    if abs(order.total - total) > PRICE_TOLERANCE or abs(order.deliveryFee - delivery_fee) > PRICE_TOLERANCE:
+        raise HTTPException(status_code=409, detail=f"Order total changed to {total:.2f}, please review your order")
+    return {**order.dict(), "items": items, "deliveryFee": delivery_fee, "total": total}
+
+# ========== INVENTORY ==========
+# Products and variants with a stock count are reserved when an order is
+# placed. Every line is a conditional decrement (stock >= quantity) sent in
+# one unordered bulk_write, so concurrent checkouts never oversell and no
+# lock is needed. Each decrement also pushes a per-line hold token; if any
+# line is short, only the lines carrying their token are given back.
+
+def _stock_line(product: Product, variant_ref: Optional[str]) -> Optional[tuple]:
+    """(productId, variantId or None) whose stock a line draws on; None if untracked"""
+    for variant in product.variants or []:
+        if variant_ref in (variant.id, variant.name) and variant.stock is not None:
+            return product.id, variant.id
+    if product.stock is not None:
+        return product.id, None
+    return None
+
+def _stock_update(reservation: dict, sign: int) -> dict:
+    """Take (sign -1) or give back (+1) a reservation's stock.
+
+    Also bumps updatedAt: catalog ETags fingerprint it, so a stock change
+    must move it for clients to stop revalidating to the old body.
+    """
+    quantity = sign * reservation["quantity"]
+    changed = {"updatedAt": datetime.utcnow()}
+    if reservation["variantId"]:
+        return {"$inc": {"variants.$.stock": quantity}, "$set": changed}
+    if sign > 0:
+        changed["inStock"] = True
+    return {"$inc": {"stock": quantity}, "$set": changed}
+
+def _stock_filter(reservation: dict) -> dict:
+    """The product (and variant) a reservation gives back to, while it still tracks stock.
+
+    An admin may have set stock to null since; $inc on null fails, and an
+    untracked count has nothing to give back, so such lines are skipped.
+    """
+    tracked = {"$type": "number"}
+    if reservation["variantId"]:
+        return {"id": reservation["productId"],
+                "variants": {"$elemMatch": {"id": reservation["variantId"], "stock": tracked}}}
+    return {"id": reservation["productId"], "stock": tracked}
+
+async def reserve_stock(order_id: str, items: List[dict]) -> List[dict]:
+    """Take stock for every tracked line of an order (all or nothing; 409 if short)"""
+    reservations, names = {}, {}
+    for item in items:
+        product = await catalog_product(item["productId"])
+        line = _stock_line(product, item.get("variant")) if product else None
+        if line:
+            reservations[line] = reservations.get(line, 0) + item["quantity"]
+            names[line] = product.name
+    if not reservations:
+        return []
     
-    order_obj = Order(**order_dict)
-    await db.orders.insert_one(order_obj.dict())
+    reservations = [
+        {"productId": product_id, "variantId": variant_id, "quantity": quantity,
+         "hold": f"{order_id}:{product_id}:{variant_id or ''}"}  # unique per line
+        for (product_id, variant_id), quantity in reservations.items()
+    ]
+    ops = []
+    for reservation in reservations:
+        if reservation["variantId"]:
+            condition = {"id": reservation["productId"], "variants": {"$elemMatch": {
+                "id": reservation["variantId"], "stock": {"$gte": reservation["quantity"]}}}}
+        else:
+            condition = {"id": reservation["productId"], "stock": {"$gte": reservation["quantity"]}}
+        update = _stock_update(reservation, -1)
+        update["$push"] = {"stockHolds": reservation["hold"]}
+        ops.append(UpdateOne(condition, update))
+    result = await db.products.bulk_write(ops, ordered=False)
+    
+    holds = [reservation["hold"] for reservation in reservations]
+    if result.modified_count < len(ops):
+        # Some line was short: find which, and give back exactly the lines that were taken
+        held = set()
+        async for doc in db.products.find({"stockHolds": {"$in": holds}}, {"_id": 0, "stockHolds": 1}):
+            held.update(doc["stockHolds"])
+        taken = [reservation for reservation in reservations if reservation["hold"] in held]
+        if taken:
+            # The hold filter spans a second array, so variants are addressed by array filter, not "$"
+            await db.products.bulk_write([
+                UpdateOne(
+                    {"id": reservation["productId"], "stockHolds": reservation["hold"]},
+                    {"$inc": {"variants.$[line].stock": reservation["quantity"]},
+                     "$set": {"updatedAt": datetime.utcnow()}, "$pull": {"stockHolds": reservation["hold"]}},
+                    array_filters=[{"line.id": reservation["variantId"]}],
+                ) if reservation["variantId"] else UpdateOne(
+                    {"id": reservation["productId"], "stockHolds": reservation["hold"]},
+                    {**_stock_update(reservation, 1), "$pull": {"stockHolds": reservation["hold"]}},
+                )
+                for reservation in taken
+            ], ordered=False)
+        short = sorted({names[(r["productId"], r["variantId"])] for r in reservations if r not in taken})
+        raise HTTPException(status_code=409, detail=f"Not enough stock for: {', '.join(short)}")
+    
+    await db.products.update_many({"stockHolds": {"$in": holds}}, {"$pull": {"stockHolds": {"$in": holds}}})
+    sold_out = [r["productId"] for r in reservations if not r["variantId"]]
+    if sold_out:
+        await db.products.update_many({"id": {"$in": sold_out}, "stock": {"$lte": 0}},
+                                      {"$set": {"inStock": False, "updatedAt": datetime.utcnow()}})
+    catalog.invalidate()
+    return [{key: r[key] for key in ("productId", "variantId", "quantity")} for r in reservations]
+
+async def release_stock(reservations: List[dict]) -> None:
+    """Give back stock taken by reserve_stock (order cancelled or not placed)"""
+    if not reservations:
+        return
+    await db.products.bulk_write([
+        UpdateOne(_stock_filter(reservation), _stock_update(reservation, 1))
+        for reservation in reservations
+    ], ordered=False)
+    catalog.invalidate()
+
+# ========== ORDER EVENTS ==========
+
+async def publish_order_event(event_type: str, data: dict) -> None:
+    """Append to the shared order event log read by the admin order stream"""
+    await order_events.publish(db, event_type, data)
+
+# ========== ORDER PLACEMENT ==========
+
+# Idempotency-Key records expire after IDEMPOTENCY_TTL_HOURS (TTL index on createdAt)
+IDEMPOTENCY_TTL_HOURS = int(os.getenv("IDEMPOTENCY_TTL_HOURS", "24"))
+IDEMPOTENCY_PENDING_TIMEOUT = 30  # seconds; longer than the function's maxDuration
+
+async def _claim_idempotency_key(key: str, request_hash: str, order_id: str) -> dict:
+    """Reserve key for this request.
+
+    Returns the key's record: status "pending" means this request owns it
+    (with the order id to use), "done" carries the original response.
+    """
+    now = datetime.utcnow()
+    record = {"key": key, "requestHash": request_hash, "orderId": order_id, "status": "pending", "createdAt": now}
+    try:
+        await db.idempotency_keys.insert_one(record)
+        return record
+    except DuplicateKeyError:
+        pass
+    
+    record = await db.idempotency_keys.find_one({"key": key}, {"_id": 0})
+    if record and record["requestHash"] != request_hash:
+        raise HTTPException(status_code=422, detail="Idempotency-Key was already used for a different request")
+    if record and record["status"] == "done":
+        return record
+    
+    # Still pending: take it over only if its owner must have died (past the function timeout)
+    record = await db.idempotency_keys.find_one_and_update(
+        {"key": key, "status": "pending", "createdAt": {"$lt": now - timedelta(seconds=IDEMPOTENCY_PENDING_TIMEOUT)}},
+        {"$set": {"createdAt": now}},
+        projection={"_id": 0},
+    )
+    if not record:
+        raise HTTPException(status_code=409, detail="A request with this Idempotency-Key is in progress",
+                            headers={"Retry-After": "2"})
+    return record
+
+async def place_order(order: OrderCreate, user: Optional[Principal], channel: str,
+                      idempotency_key: Optional[str]) -> Order:
+    """Price, store and confirm an order; an Idempotency-Key replays the first result"""
+    order_id = str(uuid.uuid4())
+    key = None
+    if idempotency_key:
+        if len(idempotency_key) > 255:
+            raise HTTPException(status_code=400, detail="Idempotency-Key is too long")
+        key = f"{user.id if user else 'guest'}:{idempotency_key}"
+        request_hash = hashlib.sha256(f"{channel}:{order.json()}".encode()).hexdigest()
+        record = await _claim_idempotency_key(key, request_hash, order_id)
+        if record["status"] == "done":
+            return Order(**record["response"])
+        order_id = record["orderId"]
+    
+    order_dict = None
+    reservations = []
+    try:
+        order_dict = await price_order(order)
+        order_dict.update(id=order_id, channel=channel)
+        if user:
+            order_dict["userId"] = user.id
+        order_obj = Order(**order_dict)
+        
+        reservations = await reserve_stock(order_id, order_dict["items"])
+        try:
+            await db.orders.insert_one({**order_obj.dict(), "stockReservations": reservations})
+            await publish_order_event("order.created", order_obj.dict())
+        except DuplicateKeyError:
+            # Taken-over key whose first attempt got as far as the insert (and its reservation)
+            await release_stock(reservations)
+            order_obj = Order(**await db.orders.find_one({"id": order_id}))
+    except Exception:
+        if reservations and order_dict is not None and not await db.orders.find_one({"id": order_id}, {"_id": 1}):
+            await release_stock(reservations)
+        if key:
+            await db.idempotency_keys.delete_one({"key": key, "status": "pending"})
+        raise
+    
+    # The order exists from here on: record it for retries before anything else can fail
+    if key:
+        await db.idempotency_keys.update_one(
+            {"key": key}, {"$set": {"status": "done", "response": order_obj.dict()}}
+        )
+    data_versions.bump("orders")
     
     # Clear cart if user is authenticated
     if user:
         await db.carts.update_one(
             {"userId": user.id},
-            {"$set": {"items": []}}
+            {"$set": {"items": [], "updatedAt": datetime.utcnow()}}
         )
-    
     return order_obj
 
+@router.post("/orders", response_model=Order)
+async def create_order(order: OrderCreate, user: Optional[Principal] = Depends(get_current_user),
+                       idempotency_key: Optional[str] = Header(None)):
+    """Create a new order"""
+    return await place_order(order, user, order.channel, idempotency_key)
+
 @router.post("/orders/whatsapp", response_model=Order)
-async def create_whatsapp_order(order: OrderCreate, user: Optional[User] = Depends(get_current_user)):
+async def create_whatsapp_order(order: OrderCreate, user: Optional[Principal] = Depends(get_current_user),
+                                idempotency_key: Optional[str] = Header(None)):
     """Create an order that will be finalized via WhatsApp"""
-    order_dict = order.dict()
-    order_dict["channel"] = "whatsapp"
-    if user:
-        order_dict["userId"] = user.id
-    
-    order_obj = Order(**order_dict)
-    await db.orders.insert_one(order_obj.dict())
-    
-    # Clear cart if user is authenticated
-    if user:
-        await db.carts.update_one(
-            {"userId": user.id},
-            {"$set": {"items": []}}
-        )
-    
-    return order_obj
+    return await place_order(order, user, "whatsapp", idempotency_key)
 
 @router.put("/orders/{order_id}/status")
-async def update_order_status(order_id: str, status: str):
-    """Update order status"""
+async def update_order_status(order_id: str, status: str, admin: Principal = Depends(require_admin)):
+    """Update order status (admin only)"""
     valid_statuses = ["pending", "confirmed", "completed", "cancelled"]
     if status not in valid_statuses:
         raise HTTPException(status_code=400, detail=f"Invalid status. Must be one of: {valid_statuses}")
     
-    result = await db.orders.update_one(
-        {"id": order_id},
-        {"$set": {"status": status}}
-    )
-    
-    if result.modified_count == 0:
-        raise HTTPException(status_code=404, detail="Order not found")
+    if status == "cancelled":
+        # Only the request that actually cancels the order gives its stock back
+        order = await db.orders.find_one_and_update(
+            {"id": order_id, "status": {"$ne": "cancelled"}},
+            {"$set": {"status": status}},
+            projection={"_id": 0, "stockReservations": 1},
+        )
+        if not order:
+            raise HTTPException(status_code=404, detail="Order not found")
+        await release_stock(order.get("stockReservations", []))
+    else:
+        reopened = await db.orders.find_one({"id": order_id, "status": "cancelled"}, {"_id": 0, "items": 1})
+        update = {"status": status}
+        if reopened:
+            # Reopening a cancelled order takes its stock again
+            update["stockReservations"] = await reserve_stock(order_id, reopened["items"])
+        result = await db.orders.update_one(
+            {"id": order_id, "status": "cancelled"} if reopened else {"id": order_id},
+            {"$set": update}
+        )
+        if result.modified_count == 0:
+            if reopened:
+                await release_stock(update["stockReservations"])
+            raise HTTPException(status_code=404, detail="Order not found")
+    data_versions.bump("orders")
+    await publish_order_event("order.status", {"orderId": order_id, "status": status})
     
     return {"message": "Order status updated successfully"}
 
@@ -631,12 +1441,15 @@ async def seed_database():
     # Insert products
     products_to_insert = [Product(**prod).dict() for prod in products_data]
     await db.products.insert_many(products_to_insert)
+    catalog.invalidate()
+    suggestions.mark_dirty()
+    search_index.rebuild(products_to_insert)
     
     # Create admin user if it doesn't exist
     existing_admin = await db.users.find_one({"email": admin_user_data["email"]})
     if not existing_admin:
         user_dict = {k: v for k, v in admin_user_data.items() if k != "password"}
-        user_dict["passwordHash"] = get_password_hash(admin_user_data["password"])
+        user_dict["passwordHash"] = await hash_password(admin_user_data["password"])
         admin_user = User(**user_dict)
         await db.users.insert_one(admin_user.dict())
     
@@ -663,7 +1476,7 @@ async def seed_admin():
     
     # Create admin user
     user_dict = {k: v for k, v in admin_user_data.items() if k != "password"}
-    user_dict["passwordHash"] = get_password_hash(admin_user_data["password"])
+    user_dict["passwordHash"] = await hash_password(admin_user_data["password"])
     admin_user = User(**user_dict)
     await db.users.insert_one(admin_user.dict())
     
@@ -676,7 +1489,7 @@ async def seed_admin():
 # ========== ADMIN ROUTES ==========
 
 @router.get("/admin/stats")
-async def get_admin_stats(admin: User = Depends(require_admin)):
+async def get_admin_stats(admin: Principal = Depends(require_admin)):
     """Get dashboard statistics for admin panel"""
     # Count products
     total_products = await db.products.count_documents({})
@@ -711,7 +1524,7 @@ async def get_admin_stats(admin: User = Depends(require_admin)):
     }
 
 @router.get("/admin/users")
-async def get_all_users(admin: User = Depends(require_admin)):
+async def get_all_users(admin: Principal = Depends(require_admin)):
     """Get all users (admin only)"""
     users = await db.users.find({}).sort("createdAt", -1).to_list(1000)
     return [
@@ -726,18 +1539,104 @@ async def get_all_users(admin: User = Depends(require_admin)):
         for user in users
     ]
 
-@router.get("/admin/orders")
-async def get_all_orders_admin(status: Optional[str] = None, admin: User = Depends(require_admin)):
+@router.post("/admin/users/{user_id}/revoke-tokens")
+async def revoke_user_tokens(user_id: str, admin: Principal = Depends(require_admin)):
+    """Invalidate every token issued to a user so far (admin only)"""
+    user_data = await db.users.find_one_and_update(
+        {"id": user_id},
+        {"$inc": {"tokenVersion": 1}, "$set": {"updatedAt": datetime.utcnow()}},
+        return_document=ReturnDocument.AFTER,
+    )
+    if not user_data:
+        raise HTTPException(status_code=404, detail="User not found")
+    token_versions.set(user_id, user_data["tokenVersion"])
+    invalidate_user(user_id)
+    return {"message": "Tokens revoked", "tokenVersion": user_data["tokenVersion"]}
+
+@router.get("/admin/cache-stats")
+async def get_cache_stats(admin: Principal = Depends(require_admin)):
+    """In-process cache hit/miss counters (admin only)"""
+    return {"catalog": catalog.stats(), "search": search_index.stats(),
+            "suggest": suggestions.stats(), "responses": response_cache.stats(),
+            "authTokens": auth_tokens.stats(), "authUsers": auth_users.stats(),
+            "tokenVersions": token_versions.stats(), "passwords": password_pool.stats(),
+            "authRateLimits": {"ip": auth_ip_limiter.stats(), "email": auth_email_limiter.stats()},
+            "orderEvents": order_events.stats()}
+
+async def compact_carts() -> dict:
+    """Drop cart lines for deleted products, then delete empty carts; returns what was removed"""
+    # Read fresh ids rather than the snapshot, which may miss products created on other instances
+    product_ids = await db.products.distinct("id")
+    deleted = {"productId": {"$nin": product_ids}}
+    has_deleted = {"items": {"$elemMatch": deleted}}
+    counted = await db.carts.aggregate([
+        {"$match": has_deleted},
+        {"$unwind": "$items"},
+        {"$match": {"items.productId": {"$nin": product_ids}}},
+        {"$count": "items"},
+    ]).to_list(1)
+    pruned = await db.carts.update_many(has_deleted, {"$pull": {"items": deleted}})
+    emptied = await db.carts.delete_many({"items": {"$size": 0}})
+    return {
+        "itemsRemoved": counted[0]["items"] if counted else 0,
+        "cartsPruned": pruned.modified_count,
+        "emptyCartsRemoved": emptied.deleted_count,
+    }
+
+async def remove_duplicate_carts() -> int:
+    """Keep only each user's most recently updated cart; returns how many were deleted.
+
+    Carts used to be created by find-then-insert, so older databases can
+    hold several per user, which blocks the unique userId index.
+    """
+    groups = await db.carts.aggregate([
+        {"$sort": {"updatedAt": -1}},
+        {"$group": {"_id": "$userId", "carts": {"$push": "$_id"}}},
+        {"$match": {"carts.1": {"$exists": True}}},
+    ]).to_list(None)
+    stale = [cart_id for group in groups for cart_id in group["carts"][1:]]
+    if not stale:
+        return 0
+    result = await db.carts.delete_many({"_id": {"$in": stale}})
+    return result.deleted_count
+
+@router.post("/admin/carts/compact")
+async def compact_carts_admin(admin: Principal = Depends(require_admin)):
+    """Remove stale cart lines and empty carts (admin only)"""
+    return await compact_carts()
+
+@router.get("/admin/orders", response_model=List[Union[OrderSummary, Order]])
+async def get_all_orders_admin(
+    response: Response,
+    status: Optional[str] = None,
+    view: str = Query("full", pattern="^(summary|full)$"),
+    limit: int = Query(1000, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    admin: Principal = Depends(require_admin),
+):
     """Get all orders with optional status filter (admin only)"""
     query = {}
     if status:
         query["status"] = status
     
-    orders = await db.orders.find(query).sort("createdAt", -1).to_list(1000)
-    return [Order(**order) for order in orders]
+    return await list_orders(query, response, view, limit, cursor)
+
+# Streams end after this long so they fit the function's maxDuration; clients reconnect
+ORDER_STREAM_MAX_SECONDS = float(os.getenv("ORDER_STREAM_MAX_SECONDS", "8"))
+
+@router.get("/admin/orders/stream")
+async def stream_orders_admin(last_event_id: Optional[str] = Header(None), admin: Principal = Depends(require_admin)):
+    """Server-Sent Events feed of order.created / order.status events (admin only)"""
+    async def events():
+        yield "retry: 3000\n\n"
+        async for event in order_events.follow(db, last_event_id, max_seconds=ORDER_STREAM_MAX_SECONDS):
+            yield sse_message(event)
+    
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 @router.post("/admin/upload-image")
-async def upload_image(file: UploadFile = File(...), admin: User = Depends(require_admin)):
+async def upload_image(file: UploadFile = File(...), admin: Principal = Depends(require_admin)):
     """Upload an image file to Cloudinary (admin only)"""
     from cloudinary_helper import upload_image as cloudinary_upload
     import traceback
@@ -778,14 +1677,20 @@ async def upload_image(file: UploadFile = File(...), admin: User = Depends(requi
 # ========== BLOG POSTS ==========
 
 @router.get("/blog", response_model=List[BlogPost])
-async def get_blog_posts(published: Optional[bool] = None):
+async def get_blog_posts(response: Response, published: Optional[bool] = None,
+                         if_none_match: Optional[str] = Header(None)):
     """Get all blog posts, optionally filter by published status"""
     query = {}
     if published is not None:
         query["published"] = published
     
+    etag = weak_etag("blog", await collection_fingerprint(db.blog_posts, query), published)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    set_etag(response, etag)
+    
     posts = await db.blog_posts.find(query).sort("date", -1).to_list(1000)
-    return [BlogPost(**post) for post in posts]
+    return json_response(trusted_rows(BlogPost, posts), response)
 
 @router.get("/blog/{post_id}", response_model=BlogPost)
 async def get_blog_post(post_id: str):
@@ -796,7 +1701,7 @@ async def get_blog_post(post_id: str):
     return BlogPost(**post)
 
 @router.post("/blog", response_model=BlogPost)
-async def create_blog_post(post_data: BlogPostCreate, user: User = Depends(require_admin)):
+async def create_blog_post(post_data: BlogPostCreate, user: Principal = Depends(require_admin)):
     """Create a new blog post (admin only)"""
     existing = await db.blog_posts.find_one({"slug": post_data.slug})
     if existing:
@@ -804,10 +1709,12 @@ async def create_blog_post(post_data: BlogPostCreate, user: User = Depends(requi
     
     post = BlogPost(**post_data.dict())
     await db.blog_posts.insert_one(post.dict())
+    suggestions.mark_dirty()
+    data_versions.bump("blog")
     return post
 
 @router.put("/blog/{post_id}", response_model=BlogPost)
-async def update_blog_post(post_id: str, post_data: BlogPostCreate, user: User = Depends(require_admin)):
+async def update_blog_post(post_id: str, post_data: BlogPostCreate, user: Principal = Depends(require_admin)):
     """Update a blog post (admin only)"""
     existing = await db.blog_posts.find_one({"id": post_id})
     if not existing:
@@ -816,44 +1723,62 @@ async def update_blog_post(post_id: str, post_data: BlogPostCreate, user: User =
     from datetime import datetime
     updated_post = BlogPost(**{**post_data.dict(), "id": post_id, "updatedAt": datetime.utcnow()})
     await db.blog_posts.replace_one({"id": post_id}, updated_post.dict())
+    suggestions.mark_dirty()
+    data_versions.bump("blog")
     return updated_post
 
 @router.delete("/blog/{post_id}")
-async def delete_blog_post(post_id: str, user: User = Depends(require_admin)):
+async def delete_blog_post(post_id: str, user: Principal = Depends(require_admin)):
     """Delete a blog post (admin only)"""
     result = await db.blog_posts.delete_one({"id": post_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Blog post not found")
+    suggestions.mark_dirty()
+    data_versions.bump("blog")
     return {"message": "Blog post deleted successfully"}
 
 @router.patch("/blog/{post_id}/publish")
-async def toggle_blog_post_published(post_id: str, user: User = Depends(require_admin)):
+async def toggle_blog_post_published(post_id: str, user: Principal = Depends(require_admin)):
     """Toggle published status of a blog post (admin only)"""
     post = await db.blog_posts.find_one({"id": post_id})
     if not post:
         raise HTTPException(status_code=404, detail="Blog post not found")
     
     new_status = not post.get("published", True)
-    await db.blog_posts.update_one({"id": post_id}, {"$set": {"published": new_status}})
+    await db.blog_posts.update_one(
+        {"id": post_id},
+        {"$set": {"published": new_status, "updatedAt": datetime.utcnow()}}
+    )
+    suggestions.mark_dirty()
+    data_versions.bump("blog")
     return {"published": new_status}
 # ========== PRODUCT REVIEWS ==========
 
 @router.get("/products/{product_id}/reviews", response_model=List[Review])
-async def get_product_reviews(product_id: str):
-    """Get all reviews for a product"""
-    reviews = await db.reviews.find({"productId": product_id}).sort("createdAt", -1).to_list(1000)
-    return [Review(**review) for review in reviews]
+async def get_product_reviews(product_id: str, response: Response,
+                              if_none_match: Optional[str] = Header(None)):
+    """Get all reviews for a product (by ID or slug)"""
+    product_id = await resolve_product_id(product_id)
+    query = {"productId": product_id}
+    etag = weak_etag("reviews", product_id, await collection_fingerprint(db.reviews, query, "createdAt"))
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    set_etag(response, etag)
+    
+    reviews = await db.reviews.find(query).sort("createdAt", -1).to_list(1000)
+    return json_response(trusted_rows(Review, reviews), response)
 
 @router.post("/products/{product_id}/reviews", response_model=Review)
-async def create_product_review(product_id: str, review_data: ReviewCreate, user: User = Depends(require_auth)):
+async def create_product_review(product_id: str, review_data: ReviewCreate, user: Principal = Depends(require_auth)):
     """Create a review for a product (authenticated users only)"""
     # Check if product exists
-    product = await db.products.find_one({"id": product_id})
+    product = await catalog_product(product_id)
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
     
     # Create review with user info
     review_dict = review_data.dict()
+    review_dict["productId"] = product.id
     review_dict["userId"] = user.id
     review_dict["userName"] = user.name
     
@@ -862,7 +1787,7 @@ async def create_product_review(product_id: str, review_data: ReviewCreate, user
     return review
 
 @router.delete("/reviews/{review_id}")
-async def delete_review(review_id: str, user: User = Depends(require_auth)):
+async def delete_review(review_id: str, user: Principal = Depends(require_auth)):
     """Delete a review (own review or admin only)"""
     review = await db.reviews.find_one({"id": review_id})
     if not review:
@@ -877,7 +1802,8 @@ async def delete_review(review_id: str, user: User = Depends(require_auth)):
 
 @router.get("/products/{product_id}/rating")
 async def get_product_rating(product_id: str):
-    """Get average rating for a product"""
+    """Get average rating for a product (by ID or slug)"""
+    product_id = await resolve_product_id(product_id)
     reviews = await db.reviews.find({"productId": product_id}).to_list(1000)
     
     if not reviews:
@@ -0,0 +1,222 @@
+"""
+In-process product search index
+
+An inverted index over product name, category, description and detail
+values. Text goes through a small Portuguese analyzer: accents are folded
+("Anéis" -> "aneis"), stopwords dropped and plurals/gender reduced by a
+light suffix stemmer, so "aneis", "anel" and "Anéis" all hit the same term.
+The last word of a query is also matched as a prefix, which makes the
+index usable for search-as-you-type.
+
+The index is built lazily from the catalog snapshot and then kept current
+by the product write routes through upsert()/remove().
+"""
+import bisect
+import os
+import re
+import time
+import unicodedata
+from collections import defaultdict
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = {
+    "a", "o", "as", "os", "e", "de", "da", "do", "das", "dos", "em", "no",
+    "na", "nos", "nas", "um", "uma", "uns", "umas", "com", "por", "para",
+    "pra", "ao", "aos", "se", "que", "ou", "sem",
+}
+
+# Field weights used for ranking
+FIELD_WEIGHTS = {"name": 4.0, "category": 2.0, "details": 1.5, "description": 1.0}
+
+# (suffix, replacement, minimum word length) applied first match wins; the
+# lengths keep short words whole ("pais" is not "pal", "reis" not "rel")
+_SUFFIX_RULES = (
+    ("oes", "ao", 4), ("aes", "ao", 4), ("ais", "al", 5), ("eis", "el", 5),
+    ("ois", "ol", 5), ("ns", "m", 4), ("res", "r", 5), ("zes", "z", 5),
+    ("ses", "s", 5), ("s", "", 4),
+)
+_GENDER_RULES = (("ada", "ado"), ("ida", "ido"), ("osa", "oso"), ("inha", "inho"))
+
+# Singular words that merely end in "s": never stripped
+_INVARIANT = {
+    "atlas", "bonus", "gas", "lapis", "mais", "menos", "onibus", "ourives",
+    "pais", "pires", "simples", "tenis", "tres", "virus",
+}
+
+
+def fold(text: str) -> str:
+    """Lowercase and strip diacritics ("Anéis" -> "aneis")"""
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+
+def stem(token: str) -> str:
+    """Light Portuguese stemmer: plural and gender normalization only"""
+    if token in _INVARIANT:
+        return token
+    for suffix, replacement, min_len in _SUFFIX_RULES:
+        if len(token) >= min_len and token.endswith(suffix):
+            token = token[: -len(suffix)] + replacement
+            break
+    for suffix, replacement in _GENDER_RULES:
+        if len(token) > len(suffix) + 2 and token.endswith(suffix):
+            return token[: -len(suffix)] + replacement
+    return token
+
+
+def words(text: str) -> List[str]:
+    """Folded, stopword-free words of text (unstemmed)"""
+    return [w for w in TOKEN_RE.findall(fold(text)) if w not in STOPWORDS]
+
+
+def _product_fields(doc: dict) -> Dict[str, str]:
+    details = " ".join(str(d.get("value", "")) for d in doc.get("details") or [])
+    return {
+        "name": doc.get("name") or "",
+        "category": doc.get("category") or "",
+        "description": doc.get("description") or "",
+        "details": details,
+    }
+
+
+class SearchIndex:
+    """Inverted index of product ids, weighted per field"""
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self.built_at: Optional[float] = None
+        self.generation = 0  # bumped by every upsert()/remove()
+        self._postings: Dict[str, Dict[str, float]] = defaultdict(dict)
+        self._doc_terms: Dict[str, Set[str]] = {}
+        self._docs: Dict[str, dict] = {}
+        # Surface (unstemmed) words -> stems, for prefix matching
+        self._surface: Dict[str, Dict[str, int]] = defaultdict(dict)
+        self._doc_surface: Dict[str, Set[tuple]] = {}
+        self._vocabulary: List[str] = []
+        self._vocabulary_dirty = False
+
+    @property
+    def stale(self) -> bool:
+        return self.built_at is None or time.monotonic() - self.built_at > self.ttl
+
+    def rebuild(self, docs: Iterable[dict], generation: Optional[int] = None) -> None:
+        """Replace the whole index with docs.
+
+        generation is the value read before docs were loaded; if a write
+        landed since, docs may predate it, so the index is left stale and
+        the next search rebuilds from fresh docs.
+        """
+        missed_writes = generation is not None and generation != self.generation
+        self._postings.clear()
+        self._doc_terms.clear()
+        self._docs.clear()
+        self._surface.clear()
+        self._doc_surface.clear()
+        for doc in docs:
+            self.upsert(doc)
+        self.built_at = None if missed_writes else time.monotonic()
+
+    def upsert(self, doc: dict) -> None:
+        """Index (or re-index) a single product document"""
+        doc_id = doc["id"]
+        self.remove(doc_id)
+        self.generation += 1
+
+        weights: Dict[str, float] = defaultdict(float)
+        surface = set()
+        for field, text in _product_fields(doc).items():
+            for word in words(text):
+                term = stem(word)
+                weights[term] += FIELD_WEIGHTS[field]
+                surface.add((word, term))
+
+        for term, weight in weights.items():
+            self._postings[term][doc_id] = weight
+        for word, term in surface:
+            refs = self._surface[word]
+            refs[term] = refs.get(term, 0) + 1
+        self._doc_terms[doc_id] = set(weights)
+        self._doc_surface[doc_id] = surface
+        self._docs[doc_id] = doc
+        self._vocabulary_dirty = True
+
+    def remove(self, doc_id: str) -> None:
+        """Drop a product from the index (no-op if it is not indexed)"""
+        self.generation += 1
+        for term in self._doc_terms.pop(doc_id, ()):
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(doc_id, None)
+                if not postings:
+                    del self._postings[term]
+        for word, term in self._doc_surface.pop(doc_id, ()):
+            refs = self._surface.get(word)
+            if refs is None:
+                continue
+            refs[term] -= 1
+            if refs[term] <= 0:
+                del refs[term]
+            if not refs:
+                del self._surface[word]
+        if self._docs.pop(doc_id, None) is not None:
+            self._vocabulary_dirty = True
+
+    def _prefix_terms(self, prefix: str) -> Set[str]:
+        if self._vocabulary_dirty:
+            self._vocabulary = sorted(self._surface)
+            self._vocabulary_dirty = False
+        terms: Set[str] = set()
+        start = bisect.bisect_left(self._vocabulary, prefix)
+        for word in self._vocabulary[start:]:
+            if not word.startswith(prefix):
+                break
+            terms.update(self._surface[word])
+        return terms
+
+    def search(self, query: str, limit: int = 20, prefix: bool = True,
+               where: Optional[Callable[[dict], bool]] = None) -> List[dict]:
+        """Return up to limit product docs matching every query word, best first.
+
+        With prefix=True the last word also matches any indexed word it
+        starts, so partial input like "brin" finds "Brincos". where, if
+        given, filters the matched docs before the limit is applied.
+        """
+        query_words = words(query)
+        if not query_words:
+            return []
+
+        scores: Optional[Dict[str, float]] = None
+        for position, word in enumerate(query_words):
+            terms = {stem(word)}
+            if prefix and position == len(query_words) - 1:
+                terms |= self._prefix_terms(word)
+
+            word_scores: Dict[str, float] = defaultdict(float)
+            for term in terms:
+                for doc_id, weight in self._postings.get(term, {}).items():
+                    word_scores[doc_id] += weight
+
+            if scores is None:
+                scores = dict(word_scores)
+            else:
+                scores = {d: s + word_scores[d] for d, s in scores.items() if d in word_scores}
+            if not scores:
+                return []
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], self._docs[item[0]].get("name", "")))
+        docs = (self._docs[doc_id] for doc_id, _ in ranked)
+        if where is not None:
+            docs = (doc for doc in docs if where(doc))
+        return [doc for _, doc in zip(range(limit), docs)]
+
+    def stats(self) -> dict:
+        return {
+            "documents": len(self._docs),
+            "terms": len(self._postings),
+            "ttl": self.ttl,
+        }
+
+
+search_index = SearchIndex(ttl=float(os.getenv("SEARCH_INDEX_TTL", "300")))
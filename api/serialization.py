@@ -0,0 +1,81 @@
+"""
+Fast JSON path for trusted database reads
+
+Documents read back from our own collections were validated by the model
+when they were written, so list endpoints do not need to build a model per
+document and then have FastAPI validate and serialize it again through
+response_model. trusted_rows() shapes raw documents exactly like
+model.model_dump() would (model fields only, defaults filled in), and
+json_response() encodes them in one orjson call.
+
+Routes keep their response_model for the OpenAPI schema; returning a
+Response directly makes FastAPI skip its own serialization.
+"""
+from typing import Iterable, List, Optional, Tuple, Type, Union, get_args, get_origin
+
+import orjson
+from fastapi import Response
+from pydantic import BaseModel
+
+_SHAPES: dict = {}
+
+
+def _nested_model(annotation) -> Tuple[Optional[Type[BaseModel]], bool]:
+    """(model, is_list) for a BaseModel, Optional[BaseModel] or List[BaseModel] field"""
+    if get_origin(annotation) is Union:
+        args = [arg for arg in get_args(annotation) if arg is not type(None)]
+        annotation = args[0] if len(args) == 1 else None
+    is_list = get_origin(annotation) in (list, List)
+    if is_list:
+        annotation = get_args(annotation)[0] if get_args(annotation) else None
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return annotation, is_list
+    return None, False
+
+
+def _shape(model: Type[BaseModel]) -> list:
+    """(name, default, default_factory, nested model, is_list) for each field of model, cached"""
+    shape = _SHAPES.get(model)
+    if shape is None:
+        shape = [
+            (name, None if field.is_required() else field.default, field.default_factory,
+             *_nested_model(field.annotation))
+            for name, field in model.model_fields.items()
+        ]
+        _SHAPES[model] = shape
+    return shape
+
+
+def trusted_row(model: Type[BaseModel], doc: dict) -> dict:
+    """Shape one trusted document as model.model_dump() would, without validation.
+
+    Nested models (and lists of them) are shaped too, so their defaults are
+    filled in for sub-documents written before a field existed.
+    """
+    row = {}
+    for name, default, factory, nested, is_list in _shape(model):
+        if name in doc:
+            value = doc[name]
+            if nested is not None and value is not None:
+                if is_list:
+                    value = [trusted_row(nested, item) if isinstance(item, dict) else item for item in value]
+                elif isinstance(value, dict):
+                    value = trusted_row(nested, value)
+            row[name] = value
+        elif factory is not None:
+            row[name] = factory()
+        else:
+            row[name] = default
+    return row
+
+
+def trusted_rows(model: Type[BaseModel], docs: Iterable[dict]) -> List[dict]:
+    return [trusted_row(model, doc) for doc in docs]
+
+
+def json_response(content, response: Response = None) -> Response:
+    """orjson-encoded JSON response, carrying over headers set on response"""
+    headers = dict(response.headers) if response is not None else None
+    if headers:
+        headers.pop("content-length", None)
+    return Response(content=orjson.dumps(content), media_type="application/json", headers=headers)
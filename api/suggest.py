@@ -0,0 +1,111 @@
+"""
+Autocomplete trie
+
+A prefix trie over product names, category names and blog titles. Every
+node stores the ids of its best N completions (by popularity weight), so
+a lookup is one walk down the prefix with no scan of the subtree. Titles
+are inserted at each word start as well, so "pra" completes
+"Anel Prata com Pedra". Keys are accent-folded with the search analyzer.
+
+Write routes only mark the trie dirty; it is rebuilt lazily on the next
+lookup (or once its TTL expires, to pick up writes on other instances).
+"""
+import os
+import time
+from typing import Iterable, List, Optional
+
+from search_index import fold
+
+TOP_N = 10
+
+
+class _Node:
+    __slots__ = ("children", "top")
+
+    def __init__(self):
+        self.children: dict = {}
+        self.top: list = []  # entry ids, best first
+
+
+class SuggestTrie:
+    """Prefix trie that keeps the top completions on every node"""
+
+    def __init__(self, ttl: float, top_n: int = TOP_N):
+        self.ttl = ttl
+        self.top_n = top_n
+        self.dirty = True
+        self.generation = 0  # bumped by every mark_dirty()
+        self.built_at: Optional[float] = None
+        self._root = _Node()
+        self._entries: List[dict] = []
+        self._weights: List[float] = []
+
+    @property
+    def stale(self) -> bool:
+        return self.dirty or self.built_at is None or time.monotonic() - self.built_at > self.ttl
+
+    def mark_dirty(self) -> None:
+        self.dirty = True
+        self.generation += 1
+
+    def build(self, entries: Iterable[dict], generation: Optional[int] = None) -> None:
+        """Rebuild from entries shaped {"text", "type", "slug", "weight"}.
+
+        generation is the value read before the entries were loaded; if a
+        write marked the trie dirty since, it stays dirty so the next
+        lookup rebuilds with that write included.
+        """
+        root = _Node()
+        self._entries = []
+        self._weights = []
+        for entry in entries:
+            text = fold(entry["text"]).strip()
+            if not text:
+                continue
+            entry_id = len(self._entries)
+            self._entries.append({k: entry[k] for k in ("text", "type", "slug")})
+            self._weights.append(entry.get("weight", 1.0))
+            starts = [0] + [i + 1 for i, ch in enumerate(text) if ch == " "]
+            for start in starts:
+                self._insert(root, text[start:], entry_id)
+        self._root = root
+        self.dirty = generation is not None and generation != self.generation
+        self.built_at = time.monotonic()
+
+    def _insert(self, root: _Node, key: str, entry_id: int) -> None:
+        node = root
+        self._offer(node, entry_id)
+        for ch in key:
+            child = node.children.get(ch)
+            if child is None:
+                child = node.children[ch] = _Node()
+            node = child
+            self._offer(node, entry_id)
+
+    def _offer(self, node: _Node, entry_id: int) -> None:
+        top = node.top
+        if entry_id in top:
+            return
+        weight = self._weights[entry_id]
+        if len(top) >= self.top_n and weight <= self._weights[top[-1]]:
+            return
+        position = len(top)
+        while position > 0 and self._weights[top[position - 1]] < weight:
+            position -= 1
+        top.insert(position, entry_id)
+        del top[self.top_n:]
+
+    def suggest(self, prefix: str, limit: int = TOP_N) -> List[dict]:
+        """Best completions for prefix (accent- and case-insensitive)"""
+        node = self._root
+        for ch in fold(prefix).lstrip():
+            node = node.children.get(ch)
+            if node is None:
+                return []
+        return [self._entries[entry_id] for entry_id in node.top[:limit]]
+
+    def stats(self) -> dict:
+        return {"entries": len(self._entries), "dirty": self.dirty, "ttl": self.ttl}
+
+
+suggestions = SuggestTrie(ttl=float(os.getenv("SUGGEST_TTL", "300")))
@@ -1,37 +1,14 @@
 import React, { useState, useEffect } from 'react';
 import { Search, X } from 'lucide-react';
 import { Link } from 'react-router-dom';
+import Price from './Price';
+import { searchProducts } from '../services/api';
 
 const SearchModal = ({ isOpen, onClose }) => {
     const [searchTerm, setSearchTerm] = useState('');
     const [results, setResults] = useState([]);
     const [loading, setLoading] = useState(false);
 
-    // Simular busca de produtos (você pode conectar à API real)
-    const mockProducts = [
-        {
-            id: 1,
-            name: 'Brincos de Pérola Dourados',
-            price: '46 KZ',
-            image: 'https://images.unsplash.com/photo-1535632066927-ab7c9ab60908?w=100&h=100&fit=crop',
-            slug: 'brincos-perola-dourados'
-        },
-        {
-            id: 2,
-            name: 'Brincos Argola Dourados',
-            price: '42 KZ',
-            image: 'https://images.unsplash.com/photo-1596944924616-7b38e7cfac36?w=100&h=100&fit=crop',
-            slug: 'brincos-argola-dourados'
-        },
-        {
-            id: 3,
-            name: 'Conjunto de Pulseiras',
-            price: '55 KZ',
-            image: 'https://images.unsplash.com/photo-1611591437281-460bfbe1220a?w=100&h=100&fit=crop',
-            slug: 'conjunto-pulseiras'
-        }
-    ];
-
     useEffect(() => {
         if (searchTerm.trim() === '') {
             setResults([]);
@@ -39,17 +16,25 @@ const SearchModal = ({ isOpen, onClose }) => {
         }
 
         setLoading(true);
+        let cancelled = false;
+
+        // Debounce: busca no servidor (índice de pesquisa da API)
+        const timer = setTimeout(async () => {
+            try {
+                const data = await searchProducts(searchTerm.trim());
+                if (!cancelled) setResults(data);
+            } catch (error) {
+                console.error('Erro na pesquisa:', error);
+                if (!cancelled) setResults([]);
+            } finally {
+                if (!cancelled) setLoading(false);
+            }
+        }, 150);
 
-        // Simular delay de busca
-        const timer = setTimeout(() => {
-            const filtered = mockProducts.filter(product =>
-                product.name.toLowerCase().includes(searchTerm.toLowerCase())
-            );
-            setResults(filtered);
-            setLoading(false);
-        }, 300);
-
-        return () => clearTimeout(timer);
+        return () => {
+            cancelled = true;
+            clearTimeout(timer);
+        };
     }, [searchTerm]);
 
     useEffect(() => {
@@ -127,12 +112,12 @@ const SearchModal = ({ isOpen, onClose }) => {
                                 {results.map((product) => (
                                     <Link
                                         key={product.id}
-                                        to={`/produto/${product.slug}`}
+                                        to={`/produtos/${product.slug}`}
                                         onClick={onClose}
                                         className="flex items-center gap-4 p-4 bg-[var(--color-bg-soft)] hover:bg-[var(--color-accent)]/30 transition border border-transparent hover:border-[var(--color-accent)]"
                                     >
                                         <img
-                                            src={product.image}
+                                            src={product.images?.[0]}
                                             alt={product.name}
                                             className="w-16 h-16 object-cover"
                                         />
@@ -140,9 +125,7 @@ const SearchModal = ({ isOpen, onClose }) => {
                                             <h3 className="font-bold text-gray-700" style={{ fontFamily: 'Poppins, sans-serif' }}>
                                                 {product.name}
                                             </h3>
-                                            <p className="text-sm text-[var(--color-primary)] font-bold" style={{ fontFamily: 'Poppins, sans-serif' }}>
-                                                {product.price}
-                                            </p>
+                                            <Price price={product.price} />
                                         </div>
                                     </Link>
                                 ))}
@@ -40,8 +40,9 @@ export const CartProvider = ({ children }) => {
       localStorage.removeItem(STORAGE_KEY);
     };
 
-    const handleLogin = () => {
+    const handleLogin = async () => {
       console.log('🟢 Cart: Reloading on login');
+      await mergeGuestCart();
       loadCart();
     };
 
@@ -54,33 +55,48 @@ export const CartProvider = ({ children }) => {
     };
   }, []);
 
+  // One cart line per product and variant
+  const isLine = (item, id, variant) =>
+    (item.productId || item.id) === id && (item.selectedVariant?.name || null) === (variant || null);
+
+  // Move the cart kept in localStorage while logged out into the account, in one request
+  const mergeGuestCart = async () => {
+    const guestItems = getInitialState();
+    if (!guestItems.length) return;
+    try {
+      await api.batchCart(
+        guestItems.map((item) => ({
+          op: 'add',
+          productId: item.productId || item.id,
+          quantity: item.quantity || 1,
+          variant: item.selectedVariant?.name || null,
+        })),
+        'merge',
+      );
+      localStorage.removeItem(STORAGE_KEY);
+    } catch (error) {
+      console.error('Error merging guest cart:', error);
+    }
+  };
+
   const loadCart = async () => {
     const token = api.getAuthToken();
 
     if (token) {
       // User authenticated - load from backend
       try {
-        const data = await api.getCart();
+        const data = await api.getCart({ expand: 'products' });
         if (data && data.items && Array.isArray(data.items)) {
-          // Backend cart items have productId and quantity
-          // We need to fetch full product data for each item
-          const itemsWithProducts = [];
-
-          for (const cartItem of data.items) {
-            try {
-              const product = await api.getProductById(cartItem.productId);
-              if (product) {
-                itemsWithProducts.push({
-                  ...product,
-                  quantity: cartItem.quantity || 1,
-                  productId: cartItem.productId,
-                  id: product.id || cartItem.productId
-                });
-              }
-            } catch (err) {
-              console.error(`Error loading product ${cartItem.productId}:`, err);
-            }
-          }
+          // Backend returns each item with its product card and variant price
+          const itemsWithProducts = data.items
+            .filter((cartItem) => cartItem.product)
+            .map((cartItem) => ({
+              ...cartItem.product,
+              price: cartItem.unitPrice,
+              quantity: cartItem.quantity || 1,
+              productId: cartItem.productId,
+              selectedVariant: cartItem.variant ? { name: cartItem.variant, price: cartItem.unitPrice } : undefined,
+            }));
 
           setItems(itemsWithProducts);
         }
@@ -118,14 +134,15 @@ export const CartProvider = ({ children }) => {
     // Authenticated - use backend
     setLoading(true);
     try {
-      await api.addToCart(product.id, quantity);
+      const variant = product.selectedVariant?.name;
+      await api.addToCart(product.id, quantity, variant);
 
       // Update local state
       setItems((prev) => {
-        const existing = prev.find((item) => (item.productId || item.id) === product.id);
+        const existing = prev.find((item) => isLine(item, product.id, variant));
         if (existing) {
           return prev.map((item) =>
-            (item.productId || item.id) === product.id
+            isLine(item, product.id, variant)
               ? { ...item, quantity: item.quantity + Math.max(1, quantity) }
               : item,
           );
@@ -146,11 +163,12 @@ export const CartProvider = ({ children }) => {
   };
 
   const addToCartLocal = (product, quantity = 1) => {
+    const variant = product.selectedVariant?.name;
     setItems((prev) => {
-      const existing = prev.find((item) => item.id === product.id);
+      const existing = prev.find((item) => isLine(item, product.id, variant));
       if (existing) {
         return prev.map((item) =>
-          item.id === product.id
+          isLine(item, product.id, variant)
             ? { ...item, quantity: item.quantity + Math.max(1, quantity) }
             : item,
         );
@@ -166,14 +184,14 @@ export const CartProvider = ({ children }) => {
 
   const addItem = (product) => addToCart(product, 1);
 
-  const removeItem = async (id) => {
+  const removeItem = async (id, variant = null) => {
     const token = api.getAuthToken();
 
     if (token) {
       setLoading(true);
       try {
-        await api.removeFromCart(id);
-        setItems((prev) => prev.filter((item) => (item.productId || item.id) !== id));
+        await api.removeFromCart(id, variant);
+        setItems((prev) => prev.filter((item) => !isLine(item, id, variant)));
         toast.success('Item removido do carrinho');
       } catch (error) {
         console.error('Error removing from cart:', error);
@@ -182,7 +200,7 @@ export const CartProvider = ({ children }) => {
         setLoading(false);
       }
     } else {
-      setItems((prev) => prev.filter((item) => item.id !== id));
+      setItems((prev) => prev.filter((item) => !isLine(item, id, variant)));
       toast.success('Item removido do carrinho');
     }
   };
@@ -204,17 +222,17 @@ export const CartProvider = ({ children }) => {
     }
   };
 
-  const updateQuantity = async (id, quantity) => {
+  const updateQuantity = async (id, quantity, variant = null) => {
     const token = api.getAuthToken();
 
     if (token) {
       setLoading(true);
       try {
-        await api.updateCartItem(id, quantity);
+        await api.updateCartItem(id, quantity, variant);
         setItems((prev) =>
           prev
             .map((item) =>
-              (item.productId || item.id) === id ? {
+              isLine(item, id, variant) ? {
                 ...item, quantity: Math.max(1, quantity)
               } : item,
             )
@@ -230,7 +248,7 @@ export const CartProvider = ({ children }) => {
       setItems((prev) =>
         prev
           .map((item) =>
-            item.id === id ? { ...item, quantity: Math.max(1, quantity) } : item,
+            isLine(item, id, variant) ? { ...item, quantity: Math.max(1, quantity) } : item,
           )
           .filter((item) => item.quantity > 0),
       );
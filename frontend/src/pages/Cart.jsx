@@ -8,19 +8,19 @@ const Cart = () => {
 
     const handleIncrement = (item) => {
         const id = item.productId || item.id;
-        updateQuantity(id, item.quantity + 1);
+        updateQuantity(id, item.quantity + 1, item.selectedVariant?.name);
     };
 
     const handleDecrement = (item) => {
         const id = item.productId || item.id;
         if (item.quantity > 1) {
-            updateQuantity(id, item.quantity - 1);
+            updateQuantity(id, item.quantity - 1, item.selectedVariant?.name);
         }
     };
 
     const handleRemove = (item) => {
         const id = item.productId || item.id;
-        removeItem(id);
+        removeItem(id, item.selectedVariant?.name);
     };
 
     return (
@@ -51,7 +51,7 @@ const Cart = () => {
                         {/* Cart Items */}
                         <div className="lg:col-span-2 space-y-4">
                             {items.map((item) => (
-                                <div key={item.productId || item.id} className="flex gap-4 p-4 border border-[var(--color-border)] bg-white hover:shadow-md transition-shadow">
+                                <div key={`${item.productId || item.id}:${item.selectedVariant?.name || ''}`} className="flex gap-4 p-4 border border-[var(--color-border)] bg-white hover:shadow-md transition-shadow">
                                     {/* Product Image */}
                                     <div className="w-24 h-24 flex-shrink-0 bg-[var(--color-bg-soft)] border border-[var(--color-border)]">
                                         <img
@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { Link, useNavigate } from 'react-router-dom';
 import { ShoppingBag, User, MapPin, MessageCircle, Truck, AlertCircle, ChevronDown } from 'lucide-react';
 import { useCart } from '../context/CartContext';
@@ -20,6 +20,8 @@ const Checkout = () => {
     const [selectedZoneId, setSelectedZoneId] = useState('');
     const [isZoneDropdownOpen, setIsZoneDropdownOpen] = useState(false);
 
+    // Reused when an order request times out, so the retry cannot create a duplicate order
+    const idempotencyKeyRef = useRef(null);
     const [formData, setFormData] = useState({
         name: '',
         email: '',
@@ -232,12 +234,17 @@ const Checkout = () => {
                 })),
                 total: cartTotal + deliveryFee,
                 deliveryFee: deliveryFee,
+                deliveryZoneId: selectedZoneId || null,
                 notes: formData.notes,
                 status: 'draft'
             };
 
             // Create order and get the order ID
-            const createdOrder = await api.createOrder(orderData);
+            if (!idempotencyKeyRef.current) {
+                idempotencyKeyRef.current = window.crypto?.randomUUID?.() || `${Date.now()}-${Math.random().toString(36).slice(2)}`;
+            }
+            const createdOrder = await api.createOrder(orderData, idempotencyKeyRef.current);
+            idempotencyKeyRef.current = null;
             const orderId = createdOrder.id;
 
             // Generate WhatsApp message with the real order ID
@@ -257,6 +264,10 @@ const Checkout = () => {
                 response: error.response?.data,
                 status: error.response?.status
             });
+            if (error.response) {
+                // The server answered, so the next attempt is a new request
+                idempotencyKeyRef.current = null;
+            }
             toast.error(`Erro ao criar pedido: ${error.response?.data?.detail || error.message}`);
         }
     };
@@ -22,10 +22,10 @@ const Dashboard = () => {
         try {
             const [statsData, ordersData] = await Promise.all([
                 getAdminStats(),
-                getAllOrdersAdmin()
+                getAllOrdersAdmin(null, { view: 'summary', limit: 5 })
             ]);
             setStats(statsData);
-            setRecentOrders(ordersData.slice(0, 5));
+            setRecentOrders(ordersData);
         } catch (error) {
             console.error('Error fetching dashboard data:', error);
         } finally {
@@ -194,7 +194,7 @@ const Dashboard = () => {
                                         #{order.id.slice(0, 8)}
                                     </td>
                                     <td className="py-4 px-4 font-['Poppins'] text-sm text-[var(--color-text)]">
-                                        {order.shippingAddress?.name || 'N/A'}
+                                        {order.customerName || 'N/A'}
                                     </td>
                                     <td className="py-4 px-4 font-['Poppins'] text-sm font-semibold text-[var(--color-text)]">
                                         {formatCurrency(order.total)}
@@ -1,6 +1,6 @@
 import React, { useState, useEffect } from 'react';
 import AdminLayout from '../../components/admin/AdminLayout';
-import { getAllOrdersAdmin, updateOrderStatus } from '../../services/api';
+import { getAllOrdersAdmin, updateOrderStatus, streamAdminOrders } from '../../services/api';
 import { toast } from 'sonner';
 import { RefreshCw, ChevronDown, ChevronUp, Package, MapPin, Phone, User } from 'lucide-react';
 
@@ -14,9 +14,29 @@ const Orders = () => {
         fetchOrders();
     }, [filter]);
 
-    const fetchOrders = async () => {
+    // Apply live order events instead of re-downloading the list
+    useEffect(() => {
+        const controller = new AbortController();
+        streamAdminOrders((type, data) => {
+            if (type === 'order.created') {
+                if (filter === 'all' || data.status === filter) {
+                    setOrders((prev) => (prev.some((order) => order.id === data.id) ? prev : [data, ...prev]));
+                }
+            } else if (type === 'order.status') {
+                setOrders((prev) => prev
+                    .map((order) => (order.id === data.orderId ? { ...order, status: data.status } : order))
+                    .filter((order) => filter === 'all' || order.status === filter));
+            } else if (type === 'resync') {
+                // The stream could not replay what was missed: reload the list once
+                fetchOrders({ quiet: true });
+            }
+        }, controller.signal);
+        return () => controller.abort();
+    }, [filter]);
+
+    const fetchOrders = async ({ quiet = false } = {}) => {
         try {
-            setLoading(true);
+            if (!quiet) setLoading(true);
             const statusParam = filter !== 'all' ? filter : null;
             const data = await getAllOrdersAdmin(statusParam);
             setOrders(data);
@@ -32,7 +52,7 @@ const Orders = () => {
         try {
             await updateOrderStatus(orderId, newStatus);
             toast.success('Status atualizado com sucesso');
-            fetchOrders();
+            setOrders((prev) => prev.map((order) => (order.id === orderId ? { ...order, status: newStatus } : order)));
         } catch (error) {
             console.error('Error updating status:', error);
             toast.error('Erro ao atualizar status');
@@ -126,6 +126,8 @@ const ProductForm = () => {
             const productData = {
                 ...formData,
                 price: parseFloat(formData.price),
+                // Stock is not edited here: sending back the stock loaded with the form would undo sales made since
+                variants: formData.variants.map(({ stock, ...variant }) => variant),
             };
 
             if (id) {
@@ -104,23 +104,30 @@ export const checkFavorite = async (productId) => {
 
 // ========== CART ==========
 
-export const getCart = async () => {
-  const response = await api.get('/cart');
+export const getCart = async ({ expand } = {}) => {
+  const response = await api.get('/cart', { params: expand ? { expand } : {} });
   return response.data;
 };
 
-export const addToCart = async (productId, quantity = 1) => {
-  const response = await api.post('/cart/items', { productId, quantity });
+export const addToCart = async (productId, quantity = 1, variant = null) => {
+  const response = await api.post('/cart/items', { productId, quantity, variant });
   return response.data;
 };
 
-export const updateCartItem = async (productId, quantity) => {
-  const response = await api.put(`/cart/items/${productId}?quantity=${quantity}`);
+export const updateCartItem = async (productId, quantity, variant = null) => {
+  const response = await api.put(`/cart/items/${productId}`, null, {
+    params: variant ? { quantity, variant } : { quantity },
+  });
+  return response.data;
+};
+
+export const removeFromCart = async (productId, variant = null) => {
+  const response = await api.delete(`/cart/items/${productId}`, { params: variant ? { variant } : {} });
   return response.data;
 };
 
-export const removeFromCart = async (productId) => {
-  const response = await api.delete(`/cart/items/${productId}`);
+export const batchCart = async (operations, mode = 'apply') => {
+  const response = await api.post('/cart/batch', { operations, mode });
   return response.data;
 };
 
@@ -135,6 +142,12 @@ export const getProductById = async (productId) => {
   return response.data;
 };
 
+// Get several products in one request ({ products, missing })
+export const getProductsBatch = async (ids) => {
+  const response = await api.get('/products/batch', { params: { ids: ids.join(',') } });
+  return response.data;
+};
+
 // Categories
 export const getCategories = async (store) => {
   const response = await api.get('/categories', { params: store ? { store } : {} });
@@ -152,10 +165,24 @@ export const getProducts = async (filters = {}) => {
   if (filters.category) params.append('category', filters.category);
   if (filters.featured !== undefined) params.append('featured', filters.featured);
   if (filters.store) params.append('store', filters.store);
+  if (filters.view) params.append('view', filters.view);
+  if (filters.limit) params.append('limit', filters.limit);
+  if (filters.cursor) params.append('cursor', filters.cursor);
   const response = await api.get(`/products?${params.toString()}`);
   return response.data;
 };
 
+// Facet counts for the filter sidebar (same params as getProducts)
+export const getProductFacets = async (params = {}) => {
+  const response = await api.get('/products/facets', { params, paramsSerializer: { indexes: null } });
+  return response.data;
+};
+
+export const searchProducts = async (q, limit = 20) => {
+  const response = await api.get('/search', { params: { q, limit } });
+  return response.data;
+};
+
 export const getProductBySlug = async (slug) => {
   const response = await api.get(`/products/${slug}`);
   return response.data;
@@ -167,13 +194,15 @@ export const createProduct = async (product) => {
 };
 
 // Orders
-export const createOrder = async (order) => {
-  const response = await api.post('/orders', order);
+export const createOrder = async (order, idempotencyKey = null) => {
+  const headers = idempotencyKey ? { 'Idempotency-Key': idempotencyKey } : {};
+  const response = await api.post('/orders', order, { headers });
   return response.data;
 };
 
-export const createWhatsappOrder = async (order) => {
-  const response = await api.post('/orders/whatsapp', order);
+export const createWhatsappOrder = async (order, idempotencyKey = null) => {
+  const headers = idempotencyKey ? { 'Idempotency-Key': idempotencyKey } : {};
+  const response = await api.post('/orders/whatsapp', order, { headers });
   return response.data;
 };
 
@@ -205,12 +234,49 @@ export const getAllUsers = async () => {
   return response.data;
 };
 
-export const getAllOrdersAdmin = async (status = null) => {
-  const params = status ? { status } : {};
+export const getAllOrdersAdmin = async (status = null, { view, limit, cursor } = {}) => {
+  const params = { ...(status ? { status } : {}), ...(view ? { view } : {}), ...(limit ? { limit } : {}), ...(cursor ? { cursor } : {}) };
   const response = await api.get('/admin/orders', { params });
   return response.data;
 };
 
+// Live order feed (Server-Sent Events over fetch, so the auth header can be sent).
+// Calls onEvent(type, data) per event and reconnects until signal is aborted.
+export const streamAdminOrders = async (onEvent, signal) => {
+  let lastEventId = null;
+  while (!signal.aborted) {
+    try {
+      const headers = { Authorization: `Bearer ${localStorage.getItem('auth_token')}` };
+      if (lastEventId) headers['Last-Event-ID'] = lastEventId;
+      const response = await fetch(`${BACKEND_URL}/admin/orders/stream`, { headers, signal });
+      if (!response.ok) throw new Error(`Order stream failed: ${response.status}`);
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+      for (;;) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        const messages = buffer.split('\n\n');
+        buffer = messages.pop();
+        for (const message of messages) {
+          const fields = {};
+          for (const line of message.split('\n')) {
+            const separator = line.indexOf(': ');
+            if (separator > 0) fields[line.slice(0, separator)] = line.slice(separator + 2);
+          }
+          if (fields.id) lastEventId = fields.id;
+          if (fields.event) onEvent(fields.event, fields.data ? JSON.parse(fields.data) : {});
+        }
+      }
+    } catch (error) {
+      if (signal.aborted) return;
+      console.warn('Order stream interrupted, reconnecting:', error);
+      await new Promise((resolve) => setTimeout(resolve, 3000));
+    }
+  }
+};
+
 // ========== BLOG ==========
 
 export const getBlogPosts = async (publishedOnly = true) => {
@@ -0,0 +1,85 @@
+"""
+Login Storm Benchmark
+Measures how a burst of password checks affects everything else on the
+event loop: a steady stream of catalog-style reads is timed while many
+concurrent logins run bcrypt, first inline (the old behaviour) and then on
+the bounded password pool from api/auth.py
+"""
+import asyncio
+import json
+import sys
+import time
+from pathlib import Path
+
+# Import the API modules the same way api/index.py does
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'api'))
+
+from auth import get_password_hash, verify_password, PasswordPool, PasswordPoolFull
+
+LOGINS = 40
+READ_INTERVAL = 0.005  # one catalog read every 5 ms
+CATALOG = [{'id': str(i), 'name': f'Produto {i}', 'price': 10.0 + i} for i in range(200)]
+
+
+async def catalog_reads(stop: asyncio.Event, latencies: list):
+    """Time a cheap in-memory read (like a warm catalog snapshot hit) end to end"""
+    while not stop.is_set():
+        scheduled = time.perf_counter()
+        await asyncio.sleep(READ_INTERVAL)
+        json.dumps(CATALOG[:20])
+        latencies.append((time.perf_counter() - scheduled - READ_INTERVAL) * 1000)
+
+
+async def storm(check) -> dict:
+    stop = asyncio.Event()
+    latencies = []
+    reader = asyncio.create_task(catalog_reads(stop, latencies))
+    await asyncio.sleep(0.05)  # baseline reads before the storm
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(check() for _ in range(LOGINS)), return_exceptions=True)
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await reader
+
+    latencies.sort()
+    return {
+        'ok': sum(1 for r in results if r is True),
+        'shed': sum(1 for r in results if isinstance(r, PasswordPoolFull)),
+        'seconds': elapsed,
+        'reads': len(latencies),
+        'p50': latencies[len(latencies) // 2],
+        'p99': latencies[int(len(latencies) * 0.99)],
+        'max': latencies[-1],
+    }
+
+
+def report(label, result):
+    print(f'{label}:')
+    print(f"  logins ok {result['ok']}, shed {result['shed']} in {result['seconds']:.2f}s")
+    print(f"  catalog reads {result['reads']:4d}  extra latency p50 {result['p50']:7.2f} ms"
+          f"  p99 {result['p99']:7.2f} ms  max {result['max']:7.2f} ms")
+
+
+async def main():
+    password_hash = get_password_hash('senha-secreta')
+
+    async def inline_check():
+        return verify_password('senha-secreta', password_hash)
+
+    pool = PasswordPool(workers=2, max_pending=LOGINS)
+    shedding_pool = PasswordPool(workers=2, max_pending=8)
+
+    print('=' * 50)
+    print(f'Login storm benchmark ({LOGINS} concurrent logins)')
+    print('=' * 50)
+    report('inline bcrypt (blocks the loop)', await storm(inline_check))
+    report('password pool', await storm(lambda: pool.run(verify_password, 'senha-secreta', password_hash)))
+    report('password pool, queue limit 8',
+           await storm(lambda: shedding_pool.run(verify_password, 'senha-secreta', password_hash)))
+    print(f'pool stats: {pool.stats()}')
+
+
+if __name__ == '__main__':
+    # For local testing: python scripts/bench_login_storm.py
+    asyncio.run(main())
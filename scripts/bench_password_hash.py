@@ -0,0 +1,57 @@
+"""
+Password Hash Cost Benchmark
+Reports hash and verify time for each bcrypt cost (and argon2, when
+argon2-cffi is installed) on this machine, to pick BCRYPT_ROUNDS /
+PASSWORD_SCHEME for the deployment target
+"""
+import os
+import sys
+import time
+from pathlib import Path
+
+# Import the API modules the same way api/index.py does
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'api'))
+
+from auth import argon2_available, build_password_context
+
+BCRYPT_ROUNDS = [int(r) for r in os.getenv('BENCH_BCRYPT_ROUNDS', '8,10,11,12,13').split(',')]
+ARGON2_TIME_COSTS = [int(t) for t in os.getenv('BENCH_ARGON2_TIME_COSTS', '1,2,3').split(',')]
+REPEAT = int(os.getenv('BENCH_REPEAT', '5'))
+PASSWORD = 'senha-secreta-123'
+
+
+def median_ms(fn):
+    timings = []
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return timings[len(timings) // 2]
+
+
+def bench(label, context):
+    password_hash = context.hash(PASSWORD)
+    hash_ms = median_ms(lambda: context.hash(PASSWORD))
+    verify_ms = median_ms(lambda: context.verify(PASSWORD, password_hash))
+    print(f'  {label:<28} hash {hash_ms:8.1f} ms   verify {verify_ms:8.1f} ms')
+
+
+def main():
+    print('=' * 50)
+    print(f'Password hash cost benchmark (median of {REPEAT})')
+    print('=' * 50)
+    print('bcrypt:')
+    for rounds in BCRYPT_ROUNDS:
+        bench(f'rounds={rounds}', build_password_context('bcrypt', bcrypt_rounds=rounds))
+    if argon2_available():
+        print('argon2:')
+        for time_cost in ARGON2_TIME_COSTS:
+            bench(f'time_cost={time_cost} (19 MiB)', build_password_context('argon2', argon2_time_cost=time_cost))
+    else:
+        print('argon2: not installed (pip install argon2-cffi)')
+
+
+if __name__ == '__main__':
+    # For local testing: python scripts/bench_password_hash.py
+    main()
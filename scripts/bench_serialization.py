@@ -0,0 +1,111 @@
+"""
+Serialization Benchmark for List Endpoints
+Compares the response_model path (build a model per document, then let
+FastAPI validate + serialize it again) against the trusted-read fast path
+(api/serialization.py: shape raw documents, encode once with orjson)
+"""
+import json
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import List
+
+# Import the API modules the same way api/index.py does
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'api'))
+
+from pydantic import TypeAdapter
+from models import Product, Order
+from serialization import trusted_rows, json_response
+
+ROWS = 1000
+REPEAT = 20
+
+
+def make_product(i):
+    now = datetime.utcnow() - timedelta(minutes=i)
+    return {
+        '_id': uuid.uuid4().hex[:24],
+        'id': str(uuid.uuid4()),
+        'name': f'Brincos Artesanais {i}',
+        'slug': f'brincos-artesanais-{i}',
+        'store': random.choice([None, 'bijuteria', 'sabonetes']),
+        'category': random.choice(['brincos', 'colares', 'aneis', 'pulseiras']),
+        'price': round(random.uniform(10, 90), 2),
+        'images': [f'https://res.cloudinary.com/demo/image/upload/p{i}_{n}.webp' for n in range(4)],
+        'description': 'Peça feita à mão com materiais selecionados. ' * 6,
+        'inStock': True,
+        'featured': i % 7 == 0,
+        'isNew': i % 5 == 0,
+        'variants': [{'id': str(uuid.uuid4()), 'name': f'Variante {n}', 'price': 20.0 + n} for n in range(2)],
+        'details': [{'label': 'Materiais', 'value': 'Prata de lei', 'icon': None}],
+        'createdAt': now,
+        'updatedAt': now,
+    }
+
+
+def make_order(i):
+    return {
+        '_id': uuid.uuid4().hex[:24],
+        'id': str(uuid.uuid4()),
+        'channel': 'web',
+        'store': None,
+        'customerName': f'Cliente {i}',
+        'customerPhone': '+244 900 000 000',
+        'customerAddress': 'Rua da Missão, Luanda',
+        'notes': None,
+        'items': [
+            {'productId': str(uuid.uuid4()), 'productName': f'Produto {n}', 'price': 25.0, 'quantity': 1, 'variant': None}
+            for n in range(3)
+        ],
+        'total': 75.0,
+        'deliveryFee': 5.0,
+        'userId': str(uuid.uuid4()),
+        'status': 'pending',
+        'createdAt': datetime.utcnow() - timedelta(minutes=i),
+    }
+
+
+def current_path(model, docs):
+    """What the routes did before: Model(**doc), then response_model validation + JSON"""
+    adapter = TypeAdapter(List[model])
+    models = [model(**doc) for doc in docs]
+    content = adapter.dump_python(adapter.validate_python(models), mode='json')
+    return json.dumps(content, ensure_ascii=False, separators=(',', ':')).encode()
+
+
+def fast_path(model, docs):
+    return json_response(trusted_rows(model, docs)).body
+
+
+def bench(label, fn, model, docs):
+    fn(model, docs)  # warm up
+    timings = []
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        fn(model, docs)
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    median = timings[len(timings) // 2]
+    print(f'  {label:<16} median {median:8.2f} ms   best {timings[0]:8.2f} ms')
+    return median
+
+
+def main():
+    print('=' * 50)
+    print(f'Serialization benchmark ({ROWS} rows, {REPEAT} runs)')
+    print('=' * 50)
+    for name, model, factory in (('products', Product, make_product), ('orders', Order, make_order)):
+        docs = [factory(i) for i in range(ROWS)]
+        assert json.loads(current_path(model, docs)) == json.loads(fast_path(model, docs)), 'outputs differ'
+        print(f'{name}:')
+        before = bench('response_model', current_path, model, docs)
+        after = bench('trusted+orjson', fast_path, model, docs)
+        print(f'  speedup          {before / after:8.1f}x')
+
+
+if __name__ == '__main__':
+    # For local testing: python scripts/bench_serialization.py
+    main()
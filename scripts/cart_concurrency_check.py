@@ -0,0 +1,60 @@
+"""
+Cart Concurrency Check
+Fires parallel "add to cart" requests for the same products and verifies
+that no quantity is lost (the cart routes must apply each add atomically)
+"""
+import os
+import sys
+import requests
+from concurrent.futures import ThreadPoolExecutor
+
+API_URL = os.getenv('API_URL', 'http://localhost:8000')
+EMAIL = os.getenv('CHECK_EMAIL')
+PASSWORD = os.getenv('CHECK_PASSWORD')
+PARALLEL_ADDS = int(os.getenv('PARALLEL_ADDS', '20'))
+
+
+def main():
+    if not EMAIL or not PASSWORD:
+        print('Set CHECK_EMAIL and CHECK_PASSWORD to a test account')
+        sys.exit(2)
+
+    session = requests.Session()
+    login = session.post(f'{API_URL}/api/auth/login', json={'email': EMAIL, 'password': PASSWORD}, timeout=30)
+    login.raise_for_status()
+    session.headers['Authorization'] = f"Bearer {login.json()['access_token']}"
+
+    products = session.get(f'{API_URL}/api/products', params={'view': 'card', 'limit': 2}, timeout=30).json()
+    product_ids = [product['id'] for product in products]
+    session.delete(f'{API_URL}/api/cart', timeout=30).raise_for_status()
+
+    def add(product_id):
+        response = session.post(f'{API_URL}/api/cart/items', json={'productId': product_id, 'quantity': 1}, timeout=30)
+        return response.status_code
+
+    # Interleave both products so new-line inserts and increments race each other
+    jobs = [product_ids[i % len(product_ids)] for i in range(PARALLEL_ADDS * len(product_ids))]
+    with ThreadPoolExecutor(max_workers=PARALLEL_ADDS) as pool:
+        statuses = list(pool.map(add, jobs))
+
+    cart = session.get(f'{API_URL}/api/cart', timeout=30).json()
+    quantities = {item['productId']: item['quantity'] for item in cart['items']}
+    failed = [status for status in statuses if status != 200]
+
+    print('=' * 50)
+    print(f'{len(jobs)} parallel adds, {len(failed)} failed requests')
+    ok = not failed and len(cart['items']) == len(product_ids)
+    for product_id in product_ids:
+        quantity = quantities.get(product_id, 0)
+        ok = ok and quantity == PARALLEL_ADDS
+        print(f'{product_id}: quantity {quantity} (expected {PARALLEL_ADDS})')
+    print('✓ No lost updates' if ok else '✗ Lost or duplicated updates')
+    print('=' * 50)
+
+    session.delete(f'{API_URL}/api/cart', timeout=30)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    # Run against a local or staging API: API_URL=... python scripts/cart_concurrency_check.py
+    main()
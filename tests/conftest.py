@@ -0,0 +1,121 @@
+import asyncio
+import os
+import sys
+from pathlib import Path
+
+import pytest
+from pymongo import ReturnDocument
+from pymongo.results import BulkWriteResult
+
+# Import the API modules the same way api/index.py does
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "api"))
+
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "test")
+
+
+def _find_one_and_update(self, filter, update, projection=None, upsert=False,
+                         return_document=ReturnDocument.BEFORE, **kwargs):
+    """mongomock re-targets the update at the matched _id, which loses a
+    positional ("items.$") match; update through the original filter as
+    MongoDB does (each mongomock call runs to completion, so it stays atomic)"""
+    before = self.find_one(filter)
+    result = self.update_one(filter, update, upsert=upsert, array_filters=kwargs.get("array_filters"))
+    if before is None and result.upserted_id is None:
+        return None
+    query = {"_id": before["_id"] if before is not None else result.upserted_id}
+    if return_document is ReturnDocument.AFTER:
+        return self.find_one(query, projection)
+    return before  # unprojected; the routes only test it for a match
+
+
+def _resolve_array_filters(doc, update, array_filters):
+    """Rewrite "items.$[name].field" paths to the indexes the array filters
+    (simple equality conditions) pick in doc; mongomock has no array filters"""
+    resolved = {}
+    for operator, fields in update.items():
+        resolved[operator] = {}
+        for path, value in fields.items():
+            paths = [path]
+            for array_filter in array_filters:
+                for condition, expected in array_filter.items():
+                    name, _, field = condition.partition(".")
+                    token = f".$[{name}]"
+                    expanded = []
+                    for candidate in paths:
+                        if token not in candidate:
+                            expanded.append(candidate)
+                            continue
+                        array = candidate.split(token)[0]
+                        expanded += [candidate.replace(token, f".{index}")
+                                     for index, item in enumerate(doc.get(array) or [])
+                                     if item.get(field) == expected]
+                    paths = expanded
+            resolved[operator].update({candidate: value for candidate in paths})
+    return resolved
+
+
+def _bulk_write(self, requests, ordered=True, **kwargs):
+    """mongomock's bulk_write rejects this pymongo's UpdateOne; apply the
+    updates one by one (each runs to completion, like each op in MongoDB)"""
+    matched = modified = 0
+    for request in requests:
+        update = request._doc
+        if request._array_filters:
+            doc = self.find_one(request._filter)
+            if doc is None:
+                continue
+            update = _resolve_array_filters(doc, update, request._array_filters)
+        result = self.update_one(request._filter, update, upsert=request._upsert)
+        matched += result.matched_count
+        modified += result.modified_count
+    return BulkWriteResult({"nMatched": matched, "nModified": modified, "nUpserted": 0,
+                            "nInserted": 0, "nRemoved": 0, "upserted": []}, True)
+
+
+def _round_trip(method):
+    """Yield to the event loop before the call, like a network round trip,
+    so concurrent requests interleave between their database operations"""
+    async def call(self, *args, **kwargs):
+        await asyncio.sleep(0)
+        return await method(self, *args, **kwargs)
+    return call
+
+
+@pytest.fixture
+def db(monkeypatch):
+    """routes.db replaced by an in-memory MongoDB (needs mongomock-motor), with a small catalog"""
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    from mongomock.collection import Collection
+
+    import routes
+    from cache import catalog
+    from models import Product
+
+    monkeypatch.setattr(Collection, "find_one_and_update", _find_one_and_update)
+    monkeypatch.setattr(Collection, "bulk_write", _bulk_write)
+    collection = mongomock_motor.AsyncMongoMockCollection
+    for name in ("find_one", "find_one_and_update", "insert_one", "update_one", "bulk_write"):
+        monkeypatch.setattr(collection, name, _round_trip(getattr(collection, name)))
+    database = mongomock_motor.AsyncMongoMockClient()["test"]
+    monkeypatch.setattr(routes, "db", database)
+    catalog.invalidate()
+
+    async def setup():
+        # Unique indexes the write paths rely on, as created by api/index.py
+        await database.carts.create_index("userId", unique=True)
+        await database.orders.create_index("id", unique=True)
+        await database.idempotency_keys.create_index("key", unique=True)
+        await database.products.insert_many([
+            Product(id=f"p{i}", name=f"Brinco {i}", slug=f"brinco-{i}", category="brincos",
+                    price=10.0 + i, images=[], description="").dict()
+            for i in range(3)
+        ] + [
+            Product(id="anel", name="Anel", slug="anel", category="aneis", price=10.0, images=[], description="",
+                    variants=[{"id": "v-prata", "name": "Prata", "price": 12.0},
+                              {"id": "v-ouro", "name": "Ouro", "price": 20.0}]).dict()
+        ])
+
+    asyncio.run(setup())
+    yield database
+    catalog.invalidate()
@@ -0,0 +1,38 @@
+import asyncio
+
+from cache import CatalogCache
+
+
+def test_filtered_views_never_evict_the_snapshot():
+    cache = CatalogCache(max_entries=4, ttl=60, max_filtered=2)
+
+    async def scenario():
+        async def snapshot():
+            return ["doc"]
+        await cache.view(("products",), snapshot)
+        for i in range(10):
+            async def positions(i=i):
+                return [i]
+            await cache.filtered_view(("products", i), positions)
+
+    asyncio.run(scenario())
+    assert cache.cached(("products",))
+    assert cache.stats()["filtered"]["entries"] == 2
+
+
+def test_invalidate_drops_filtered_views():
+    cache = CatalogCache(max_entries=4, ttl=60, max_filtered=2)
+    builds = []
+
+    async def build():
+        builds.append(1)
+        return [0]
+
+    async def scenario():
+        await cache.filtered_view("featured", build)
+        await cache.filtered_view("featured", build)
+        cache.invalidate()
+        await cache.filtered_view("featured", build)
+
+    asyncio.run(scenario())
+    assert len(builds) == 2
@@ -0,0 +1,119 @@
+"""Cart write paths against an in-memory MongoDB (needs mongomock-motor)"""
+import asyncio
+from datetime import datetime
+
+import pytest
+
+pytest.importorskip("mongomock_motor")
+
+import routes
+from cache import catalog
+from models import CartBatch, CartItem, CartOperation, Principal
+
+USER = Principal(id="u1", email="cliente@example.com", name="Cliente")
+
+
+def cart_lines(database):
+    cart = asyncio.run(database.carts.find_one({"userId": USER.id}))
+    return {item["productId"]: item["quantity"] for item in cart["items"]}
+
+
+def test_concurrent_adds_of_one_product_never_lose_quantities(db):
+    async def adds():
+        await asyncio.gather(*(routes.add_to_cart(CartItem(productId="p0", quantity=2), USER) for _ in range(20)))
+
+    asyncio.run(adds())
+    assert cart_lines(db) == {"p0": 40}
+    assert asyncio.run(db.carts.count_documents({"userId": USER.id})) == 1
+
+
+def test_concurrent_adds_of_different_products_all_land(db):
+    async def adds():
+        await asyncio.gather(*(
+            routes.add_to_cart(CartItem(productId=f"p{i % 3}", quantity=1), USER) for i in range(30)
+        ))
+
+    asyncio.run(adds())
+    assert cart_lines(db) == {"p0": 10, "p1": 10, "p2": 10}
+
+
+def variant_lines(database):
+    cart = asyncio.run(database.carts.find_one({"userId": USER.id}))
+    return {(item["productId"], item["variant"]): item["quantity"] for item in cart["items"]}
+
+
+def test_variants_of_one_product_are_separate_lines(db):
+    async def adds():
+        await asyncio.gather(
+            routes.add_to_cart(CartItem(productId="anel", quantity=1, variant="Prata"), USER),
+            routes.add_to_cart(CartItem(productId="anel", quantity=1, variant="v-ouro"), USER),  # by id
+            routes.add_to_cart(CartItem(productId="anel", quantity=1, variant="Prata"), USER),
+        )
+        return await routes.get_cart(expand="products", user=USER)
+
+    cart = asyncio.run(adds())
+    assert variant_lines(db) == {("anel", "Prata"): 2, ("anel", "Ouro"): 1}
+    assert cart.subtotal == 44.0
+
+
+def test_update_and_remove_touch_only_their_variant(db):
+    async def scenario():
+        await routes.add_to_cart(CartItem(productId="anel", quantity=1, variant="Prata"), USER)
+        await routes.add_to_cart(CartItem(productId="anel", quantity=1, variant="Ouro"), USER)
+        await routes.add_to_cart(CartItem(productId="anel", quantity=1), USER)
+        await routes.update_cart_item("anel", 5, variant="v-prata", user=USER)
+        await routes.remove_from_cart("anel", variant="Ouro", user=USER)
+
+    asyncio.run(scenario())
+    assert variant_lines(db) == {("anel", "Prata"): 5, ("anel", None): 1}
+
+
+def test_batch_keys_lines_on_product_and_variant(db):
+    batch = CartBatch(operations=[
+        CartOperation(op="add", productId="anel", quantity=1, variant="Prata"),
+        CartOperation(op="add", productId="anel", quantity=2, variant="Ouro"),
+        CartOperation(op="set", productId="anel", quantity=3, variant="Prata"),
+        CartOperation(op="add", productId="anel", quantity=1, variant="Bronze"),
+    ], mode="merge")
+
+    asyncio.run(routes.batch_cart(batch, USER))
+    assert variant_lines(db) == {("anel", "Prata"): 3, ("anel", "Ouro"): 2}
+
+
+def test_unknown_variant_is_rejected(db):
+    with pytest.raises(routes.HTTPException) as error:
+        asyncio.run(routes.add_to_cart(CartItem(productId="anel", quantity=1, variant="Bronze"), USER))
+    assert error.value.status_code == 400
+
+
+def test_duplicate_carts_are_reduced_to_the_latest(db):
+    async def scenario():
+        # Databases from before the unique userId index can hold several carts per user
+        await db.carts.drop_index("userId_1")
+        await db.carts.insert_many([
+            {"userId": USER.id, "items": [{"productId": "p0", "quantity": 1}], "updatedAt": datetime(2025, 1, 1)},
+            {"userId": USER.id, "items": [{"productId": "p1", "quantity": 1}], "updatedAt": datetime(2025, 3, 1)},
+            {"userId": USER.id, "items": [], "updatedAt": datetime(2025, 2, 1)},
+            {"userId": "u2", "items": [], "updatedAt": datetime(2025, 1, 1)},
+        ])
+        removed = await routes.remove_duplicate_carts()
+        await db.carts.create_index("userId", unique=True)
+        return removed
+
+    assert asyncio.run(scenario()) == 2
+    assert cart_lines(db) == {"p1": 1}
+    assert asyncio.run(db.carts.count_documents({})) == 2
+
+
+def test_batch_removes_a_line_whose_variant_was_deleted(db):
+    async def scenario():
+        await routes.add_to_cart(CartItem(productId="anel", quantity=1, variant="Ouro"), USER)
+        await routes.add_to_cart(CartItem(productId="anel", quantity=1, variant="Prata"), USER)
+        await db.products.update_one({"id": "anel"}, {"$pull": {"variants": {"name": "Ouro"}}})
+        catalog.invalidate()
+        await routes.batch_cart(CartBatch(operations=[
+            CartOperation(op="remove", productId="anel", variant="Ouro"),
+        ]), USER)
+
+    asyncio.run(scenario())
+    assert variant_lines(db) == {("anel", "Prata"): 1}
@@ -0,0 +1,68 @@
+"""Shared order event log against an in-memory MongoDB (needs mongomock-motor)"""
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+pytest.importorskip("mongomock_motor")
+
+from events import EventLog, ready_events
+
+
+def collect(log, database, last_event_id, max_seconds=0.05):
+    async def run():
+        return [event async for event in log.follow(database, last_event_id, poll=0.01, max_seconds=max_seconds)]
+    return asyncio.run(run())
+
+
+def publish(log, database, count):
+    async def run():
+        return [await log.publish(database, "order.status", {"orderId": f"o{i}"}) for i in range(count)]
+    return asyncio.run(run())
+
+
+def test_ids_are_shared_by_every_instance(db):
+    # Two logs stand in for two serverless instances on one database
+    first, second = EventLog("order_events"), EventLog("order_events")
+    assert publish(first, db, 2) == [1, 2]
+    assert publish(second, db, 1) == [3]
+    assert [event[0] for event in collect(second, db, "1")] == [2, 3]
+    assert [event[0] for event in collect(first, db, "0")] == [1, 2, 3]
+
+
+def test_new_stream_starts_after_the_latest_event(db):
+    log = EventLog("order_events")
+    publish(log, db, 2)
+
+    async def run():
+        stream = log.follow(db, None, poll=0.01, max_seconds=0.2)
+        await asyncio.sleep(0)
+        publisher = asyncio.create_task(log.publish(db, "order.created", {"id": "new"}))
+        events = [event async for event in stream]
+        await publisher
+        return events
+
+    assert asyncio.run(run()) == [(3, "order.created", {"id": "new"})]
+
+
+@pytest.mark.parametrize("last_event_id", ["abc", "-1", "99"])
+def test_ids_not_issued_by_the_log_resync(db, last_event_id):
+    log = EventLog("order_events")
+    publish(log, db, 2)
+    assert collect(log, db, last_event_id) == [(2, "resync", {})]
+
+
+def test_expired_events_resync(db):
+    log = EventLog("order_events")
+    publish(log, db, 3)
+    asyncio.run(db.order_events.delete_many({"seq": {"$lte": 1}}))
+    assert collect(log, db, "0") == [(3, "resync", {})]
+    assert [event[0] for event in collect(log, db, "1")] == [2, 3]
+
+
+def test_readers_wait_briefly_at_a_gap():
+    now = datetime.utcnow()
+    docs = [{"seq": 1, "createdAt": now}, {"seq": 3, "createdAt": now}]
+    assert [doc["seq"] for doc in ready_events(docs, 0, now)] == [1]
+    # A gap that has not filled within the grace period is skipped
+    assert [doc["seq"] for doc in ready_events(docs, 0, now + timedelta(seconds=5))] == [1, 3]
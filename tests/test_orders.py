@@ -0,0 +1,122 @@
+"""Order pricing, placement and Idempotency-Key replay against an in-memory MongoDB (needs mongomock-motor)"""
+import asyncio
+from datetime import timedelta
+
+import pytest
+
+pytest.importorskip("mongomock_motor")
+
+import routes
+from models import OrderCreate
+
+ORDER = {"customerName": "Cliente", "customerPhone": "900 000 000", "customerAddress": "Luanda"}
+
+
+def order(items, total):
+    return OrderCreate(**ORDER, items=items, total=total)
+
+
+def test_variant_lines_are_priced_from_the_catalog(db):
+    priced = asyncio.run(routes.price_order(order([
+        {"productId": "anel", "quantity": 2, "variant": "Ouro"},
+        {"productId": "brinco-1", "quantity": 1},
+    ], total=51.0)))
+    assert [item["price"] for item in priced["items"]] == [20.0, 11.0]
+    assert priced["items"][1]["productId"] == "p1"
+
+
+def test_unknown_variant_is_rejected(db):
+    with pytest.raises(routes.HTTPException) as error:
+        asyncio.run(routes.price_order(order([{"productId": "anel", "quantity": 1, "variant": "Bronze"}], total=10.0)))
+    assert error.value.status_code == 400
+
+
+def test_client_total_mismatch_is_rejected(db):
+    with pytest.raises(routes.HTTPException) as error:
+        asyncio.run(routes.price_order(order([{"productId": "anel", "quantity": 1, "variant": "Prata"}], total=10.0)))
+    assert error.value.status_code == 409
+
+
+def place(new_order, key="checkout-1"):
+    return routes.place_order(new_order, None, "web", key)
+
+
+def paused_pricing(monkeypatch):
+    """Make price_order wait until the returned event is set (a request in flight)"""
+    release = asyncio.Event()
+    price_order = routes.price_order
+
+    async def paused(new_order):
+        await release.wait()
+        return await price_order(new_order)
+
+    monkeypatch.setattr(routes, "price_order", paused)
+    return release
+
+
+P0 = order([{"productId": "p0", "quantity": 1}], total=10.0)
+
+
+def test_retry_with_the_key_replays_the_first_order(db):
+    async def twice():
+        return await place(P0), await place(P0)
+
+    first, retry = asyncio.run(twice())
+    assert retry.id == first.id
+    assert asyncio.run(db.orders.count_documents({})) == 1
+
+
+def test_key_reused_for_a_different_order_is_rejected(db):
+    asyncio.run(place(P0))
+    with pytest.raises(routes.HTTPException) as error:
+        asyncio.run(place(order([{"productId": "p0", "quantity": 2}], total=20.0)))
+    assert error.value.status_code == 422
+
+
+def test_retry_while_the_first_request_runs_is_told_to_wait(db, monkeypatch):
+    release = paused_pricing(monkeypatch)
+
+    async def overlapping():
+        first = asyncio.create_task(place(P0))
+        await asyncio.sleep(0.01)
+        with pytest.raises(routes.HTTPException) as error:
+            await place(P0)
+        release.set()
+        return error.value, await first
+
+    error, first = asyncio.run(overlapping())
+    assert error.status_code == 409 and error.headers["Retry-After"] == "2"
+    assert asyncio.run(db.orders.count_documents({})) == 1
+
+
+def test_stale_claim_is_taken_over_with_its_order_id(db, monkeypatch):
+    release = paused_pricing(monkeypatch)
+
+    async def abandoned_then_retried():
+        first = asyncio.create_task(place(P0))  # stands in for a request whose function died
+        await asyncio.sleep(0.01)
+        first.cancel()
+        claim = await db.idempotency_keys.find_one({"key": "guest:checkout-1"})
+        await db.idempotency_keys.update_one({"key": "guest:checkout-1"}, {"$set": {
+            "createdAt": claim["createdAt"] - timedelta(seconds=routes.IDEMPOTENCY_PENDING_TIMEOUT + 1)}})
+        release.set()
+        return claim, await place(P0)
+
+    claim, retry = asyncio.run(abandoned_then_retried())
+    assert retry.id == claim["orderId"]
+    record = asyncio.run(db.idempotency_keys.find_one({"key": "guest:checkout-1"}))
+    assert record["status"] == "done"
+
+
+def test_failed_request_releases_its_claim(db, monkeypatch):
+    async def short_stock(new_order):
+        raise routes.HTTPException(status_code=409, detail="Not enough stock for: Brinco 0")
+
+    price_order = routes.price_order
+    monkeypatch.setattr(routes, "price_order", short_stock)
+    with pytest.raises(routes.HTTPException):
+        asyncio.run(place(P0))
+    assert asyncio.run(db.idempotency_keys.count_documents({})) == 0
+
+    monkeypatch.setattr(routes, "price_order", price_order)
+    assert asyncio.run(place(P0)).total == 10.0
@@ -0,0 +1,61 @@
+import pytest
+
+from search_index import SearchIndex, fold, stem
+
+
+def analyzed(word):
+    return stem(fold(word))
+
+
+@pytest.mark.parametrize("plural, singular", [
+    ("Anéis", "anel"),
+    ("brincos", "brinco"),
+    ("colares", "colar"),
+    ("papéis", "papel"),
+    ("lençóis", "lençol"),
+    ("pães", "pão"),
+    ("reais", "real"),
+    ("nuvens", "nuvem"),
+    ("luzes", "luz"),
+    ("países", "país"),
+    ("cheirosas", "cheiroso"),
+])
+def test_plural_and_gender_forms_share_a_stem(plural, singular):
+    assert analyzed(plural) == analyzed(singular)
+
+
+@pytest.mark.parametrize("word, expected", [
+    ("país", "pais"),
+    ("mais", "mais"),
+    ("reis", "rei"),
+    ("bois", "boi"),
+    ("lápis", "lapis"),
+    ("tênis", "tenis"),
+    ("gás", "gas"),
+])
+def test_short_and_invariant_words_are_not_overstemmed(word, expected):
+    assert analyzed(word) == expected
+
+
+def test_search_is_accent_insensitive_and_keeps_short_words():
+    index = SearchIndex(ttl=60)
+    index.rebuild([
+        {"id": "1", "name": "Sabonete do País", "category": "sabonetes"},
+        {"id": "2", "name": "Pulseira de Pal", "category": "pulseiras"},
+    ])
+    assert [doc["id"] for doc in index.search("pais", prefix=False)] == ["1"]
+    assert [doc["id"] for doc in index.search("País", prefix=False)] == ["1"]
+    assert [doc["id"] for doc in index.search("pal", prefix=False)] == ["2"]
+
+
+def test_rebuild_from_docs_read_before_a_write_stays_stale():
+    index = SearchIndex(ttl=60)
+    generation = index.generation
+    index.upsert({"id": "1", "name": "Colar de Prata"})  # lands while the rebuild's docs load
+    index.rebuild([], generation)
+    assert index.stale
+
+    generation = index.generation
+    index.rebuild([{"id": "1", "name": "Colar de Prata"}], generation)
+    assert not index.stale
+    assert [doc["id"] for doc in index.search("colar")] == ["1"]
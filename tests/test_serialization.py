@@ -0,0 +1,25 @@
+from datetime import datetime
+
+from models import Order, Product
+from serialization import trusted_row
+
+
+def test_nested_defaults_match_model_dump():
+    now = datetime(2026, 1, 1)
+    # Written before variants tracked stock and before details had icons
+    doc = {
+        "_id": "abc", "id": "p1", "name": "Anel", "slug": "anel", "category": "aneis",
+        "price": 20.0, "images": ["a.webp"], "description": "Prata",
+        "variants": [{"id": "v1", "name": "Prata", "price": 25.0}],
+        "details": [{"label": "Materiais", "value": "Prata de lei"}],
+        "createdAt": now, "updatedAt": now,
+    }
+    assert trusted_row(Product, doc) == Product(**doc).model_dump()
+
+
+def test_list_of_nested_models_in_orders():
+    doc = {
+        "id": "o1", "customerName": "Cliente", "customerPhone": "900", "customerAddress": "Luanda",
+        "items": [{"productId": "p1", "quantity": 2}], "total": 40.0, "createdAt": datetime(2026, 1, 1),
+    }
+    assert trusted_row(Order, doc) == Order(**doc).model_dump()
@@ -0,0 +1,115 @@
+"""Stock reservations for orders against an in-memory MongoDB (needs mongomock-motor)"""
+import asyncio
+
+import pytest
+
+pytest.importorskip("mongomock_motor")
+
+import routes
+from cache import catalog
+from models import OrderCreate, Principal
+
+ADMIN = Principal(id="admin", email="admin@example.com", name="Admin", isAdmin=True)
+ORDER = {"customerName": "Cliente", "customerPhone": "900 000 000", "customerAddress": "Luanda"}
+PRICES = {("p0", None): 10.0, ("p1", None): 11.0, ("anel", "Prata"): 12.0, ("anel", "Ouro"): 20.0}
+
+
+def order(*lines):
+    """An order for (productId, quantity[, variant]) lines, with the right total"""
+    items = [{"productId": line[0], "quantity": line[1], "variant": line[2] if len(line) > 2 else None}
+             for line in lines]
+    total = sum(PRICES[item["productId"], item["variant"]] * item["quantity"] for item in items)
+    return OrderCreate(**ORDER, items=items, total=total)
+
+
+def set_stock(database, **stock):
+    """Track stock on products (p0=3) or anel's variants (Prata=3)"""
+    async def update():
+        for name, count in stock.items():
+            if name.startswith("p"):
+                await database.products.update_one({"id": name}, {"$set": {"stock": count}})
+            else:
+                await database.products.update_one({"id": "anel", "variants.name": name},
+                                                   {"$set": {"variants.$.stock": count}})
+    asyncio.run(update())
+    catalog.invalidate()
+
+
+def stock(database):
+    async def read():
+        return await database.products.find({}, {"_id": 0}).to_list(None)
+    counts = {}
+    for product in asyncio.run(read()):
+        if product.get("stock") is not None:
+            counts[product["id"]] = product["stock"]
+        for variant in product.get("variants") or []:
+            if variant.get("stock") is not None:
+                counts[variant["name"]] = variant["stock"]
+        assert not product.get("stockHolds")  # no hold token outlives its order
+    return counts
+
+
+def place(new_order):
+    return routes.place_order(new_order, None, "web", None)
+
+
+def test_concurrent_orders_never_oversell_the_last_unit(db):
+    set_stock(db, p0=1, Prata=1)
+
+    async def checkouts():
+        return await asyncio.gather(*(
+            place(order(("p0", 1), ("anel", 1, "Prata"))) for _ in range(10)
+        ), return_exceptions=True)
+
+    results = asyncio.run(checkouts())
+    placed = [result for result in results if not isinstance(result, Exception)]
+    refused = [result for result in results if isinstance(result, routes.HTTPException)]
+    assert len(placed) == 1 and len(refused) == 9
+    assert all(error.status_code == 409 for error in refused)
+    assert stock(db) == {"p0": 0, "Prata": 0}
+    assert asyncio.run(db.products.find_one({"id": "p0"}))["inStock"] is False
+
+
+def test_a_short_line_rolls_back_the_lines_already_taken(db):
+    set_stock(db, p0=5, p1=1, Prata=3, Ouro=1)
+
+    with pytest.raises(routes.HTTPException) as error:
+        asyncio.run(place(order(("p0", 2), ("p1", 2), ("anel", 1, "Prata"), ("anel", 2, "Ouro"))))
+    assert error.value.status_code == 409
+    assert error.value.detail == "Not enough stock for: Anel, Brinco 1"
+    assert stock(db) == {"p0": 5, "p1": 1, "Prata": 3, "Ouro": 1}
+    assert asyncio.run(db.orders.count_documents({})) == 0
+
+
+def test_cancel_gives_stock_back_and_reopen_takes_it_again(db):
+    set_stock(db, p0=3, Prata=3)
+    placed = asyncio.run(place(order(("p0", 2), ("anel", 1, "Prata"))))
+    assert stock(db) == {"p0": 1, "Prata": 2}
+
+    asyncio.run(routes.update_order_status(placed.id, "cancelled", admin=ADMIN))
+    assert stock(db) == {"p0": 3, "Prata": 3}
+
+    asyncio.run(routes.update_order_status(placed.id, "confirmed", admin=ADMIN))
+    assert stock(db) == {"p0": 1, "Prata": 2}
+
+
+def test_reopen_is_refused_when_the_stock_has_gone(db):
+    set_stock(db, p0=2)
+    placed = asyncio.run(place(order(("p0", 2))))
+    asyncio.run(routes.update_order_status(placed.id, "cancelled", admin=ADMIN))
+    asyncio.run(place(order(("p0", 1))))
+
+    with pytest.raises(routes.HTTPException) as error:
+        asyncio.run(routes.update_order_status(placed.id, "pending", admin=ADMIN))
+    assert error.value.status_code == 409
+    assert stock(db) == {"p0": 1}
+    assert asyncio.run(db.orders.find_one({"id": placed.id}))["status"] == "cancelled"
+
+
+def test_cancel_skips_stock_no_longer_tracked(db):
+    set_stock(db, p0=3, Prata=3, Ouro=3)
+    placed = asyncio.run(place(order(("p0", 1), ("anel", 1, "Prata"), ("anel", 1, "Ouro"))))
+    set_stock(db, p0=None, Prata=None)
+
+    asyncio.run(routes.update_order_status(placed.id, "cancelled", admin=ADMIN))
+    assert stock(db) == {"Ouro": 3}
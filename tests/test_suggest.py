@@ -0,0 +1,23 @@
+from suggest import SuggestTrie
+
+
+def entry(text, weight=1.0):
+    return {"text": text, "type": "product", "slug": text.lower().replace(" ", "-"), "weight": weight}
+
+
+def test_suggest_matches_word_starts_without_accents():
+    trie = SuggestTrie(ttl=60)
+    trie.build([entry("Anel Prata com Pedra"), entry("Pulseira Pérola", weight=2.0)])
+    assert [s["text"] for s in trie.suggest("pe")] == ["Pulseira Pérola", "Anel Prata com Pedra"]
+
+
+def test_write_during_build_keeps_the_trie_dirty():
+    trie = SuggestTrie(ttl=60)
+    generation = trie.generation
+    trie.mark_dirty()  # a product write lands while the entries load
+    trie.build([entry("Brincos")], generation)
+    assert trie.stale
+
+    generation = trie.generation
+    trie.build([entry("Brincos"), entry("Colar")], generation)
+    assert not trie.stale